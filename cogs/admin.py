@@ -2,10 +2,12 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 from cogs.banking import get_credit_history
-from db.banking import log_transaction, get_current_credits
-from db.gangs import get_gang_by_id
-from db.gang_assets import insert_gang_asset, delete_gang_asset
+from db.aio import log_transaction, get_current_credits, verify_balances, get_gang_by_id, insert_gang_asset, delete_gang_asset
 from cogs.autocomplete import gang_autocomplete,asset_type_autocomplete, asset_autocomplete, resolve_user_preferences, MissingPreferenceError
+from db import get_pool, run_db, checkpoint
+from db.cache import cache_stats
+from db.writer import get_write_queue
+from services.dice import FormulaError
 import os
 
 admin_group = app_commands.Group(name="admin", description="Admin tools")
@@ -21,11 +23,60 @@ async def export_db_slash(interaction: discord.Interaction):
         return
 
     if os.path.exists("necromunda.db"):
+        await run_db(checkpoint)
         await interaction.response.send_message("Here is the database:", ephemeral=True)
         await interaction.followup.send(file=discord.File("necromunda.db"))
     else:
         await interaction.response.send_message("Database file not found.", ephemeral=True)
 
+@admin_group.command(name="db_stats", description="Show database connection pool and cache statistics")
+async def db_stats(interaction: discord.Interaction):
+    if interaction.user.id != interaction.client.owner_id:
+        await interaction.response.send_message("You are not authorized to use this command.", ephemeral=True)
+        return
+
+    pool = get_pool()
+    stats = pool.stats()
+    embed = discord.Embed(title="Database Stats", color=discord.Color.dark_grey())
+    embed.add_field(
+        name="Connections",
+        value=(
+            f"**In use:** {stats['in_use']} / {stats['max_size']}\n"
+            f"**Idle:** {stats['idle']}\n"
+            f"**Created:** {stats['created']}\n"
+            f"**Waits:** {stats['waits']}"
+        ),
+        inline=False
+    )
+    writes = get_write_queue().stats()
+    embed.add_field(
+        name="Write queue",
+        value=(
+            f"**Writes:** {writes['writes']} in {writes['batches']} commits\n"
+            f"**Queued:** {writes['queued']}\n"
+            f"**Busy retries:** {writes['busy_retries']}"
+        ),
+        inline=False
+    )
+    for name, cache in cache_stats().items():
+        lookups = cache['hits'] + cache['misses']
+        hit_rate = f"{cache['hits'] / lookups:.0%}" if lookups else "n/a"
+        embed.add_field(
+            name=f"Cache: {name}",
+            value=(
+                f"**Entries:** {cache['size']} / {cache['maxsize']}\n"
+                f"**Hits:** {cache['hits']} | **Misses:** {cache['misses']} ({hit_rate})"
+            ),
+            inline=True
+        )
+    leaks = pool.leaks()
+    embed.add_field(
+        name="Held > 30s",
+        value="\n".join(f"`{site}` ({held:.0f}s)" for site, held, _ in leaks[:10]) or "None",
+        inline=False
+    )
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
 @admin_group.command(
     name="adjust_credits",
     description="(Admin) Adjust any gang's credits in *this* campaign"
@@ -46,18 +97,18 @@ async def admin_adjust(
         await interaction.response.send_message("You are not authorized to use this command.", ephemeral=True)
         return
 
-    current = get_current_credits(gang_id)
+    current = await get_current_credits(gang_id)
     if amount < 0 and current < -amount:
-        gang = get_gang_by_id(gang_id)
+        gang = await get_gang_by_id(gang_id)
         await interaction.response.send_message(
             f"❌ Cannot subtract {abs(amount)} credits; **{gang[3]}** only has {current}.",
             ephemeral=True
         )
         return
 
-    log_transaction(gang_id, amount, reason, interaction.user.id)
-    total = get_current_credits(gang_id)
-    gang = get_gang_by_id(gang_id)
+    await log_transaction(gang_id, amount, reason, interaction.user.id)
+    total = await get_current_credits(gang_id)
+    gang = await get_gang_by_id(gang_id)
     verb = "Added" if amount >= 0 else "Subtracted"
     await interaction.response.send_message(
         f"✅ {verb} {abs(amount)} credits "
@@ -81,46 +132,61 @@ async def set_credits(interaction: discord.Interaction,
         return
         
     try:
-        campaign_id, _ = resolve_user_preferences(interaction, require_campaign=True, require_gang=False)
+        campaign_id, _ = await resolve_user_preferences(interaction, require_campaign=True, require_gang=False)
     except MissingPreferenceError as e:
         await interaction.response.send_message(str(e), ephemeral=True)
         return
 
-    current = get_current_credits(gang_id)
-    gang = get_gang_by_id(gang_id)
+    current = await get_current_credits(gang_id)
+    gang = await get_gang_by_id(gang_id)
     delta = amount - current
-    log_transaction(gang_id, delta, reason, interaction.user.id)
+    await log_transaction(gang_id, delta, reason, interaction.user.id)
     await interaction.response.send_message(
         f"✅ New Balance: **{abs(amount)}** credits "
         f"Old balance: **{current}** credits."
     )
 
+@admin_group.command(name="verify_balances", description="Check stored gang balances against the transaction ledger")
+@app_commands.describe(rebuild="Rebuild the stored balances from the ledger if any are wrong")
+async def verify_balances_slash(interaction: discord.Interaction, rebuild: bool = False):
+    if interaction.user.id != interaction.client.owner_id:
+        await interaction.response.send_message("You are not authorized to use this command.", ephemeral=True)
+        return
+
+    mismatches = await verify_balances(rebuild)
+    if not mismatches:
+        await interaction.response.send_message("✅ All gang balances match the ledger.", ephemeral=True)
+        return
+
+    lines = [f"Gang {gang_id}: stored {stored}, ledger {ledger}" for gang_id, stored, ledger in mismatches[:20]]
+    if len(mismatches) > 20:
+        lines.append(f"... and {len(mismatches) - 20} more")
+    action = "Rebuilt balances from the ledger." if rebuild else "Run with `rebuild` to fix them."
+    await interaction.response.send_message(
+        f"⚠️ {len(mismatches)} balance(s) disagree with the ledger:\n" + "\n".join(lines) + f"\n{action}",
+        ephemeral=True
+    )
+
 @admin_group.command(
     name="credit_history",
     description="Show a gang's credit transaction history (paged)"
 )
 @app_commands.describe(
-    page="Which page to view (starting at 1)",
+    gang_id="Target gang",
     limit="How many entries per page"
 )
 @app_commands.autocomplete(gang_id=gang_autocomplete)
 async def credit_history(
     interaction: discord.Interaction,
     gang_id: int,
-    page: int = 1,
     limit: int = 10
 ):
     if interaction.user.id != interaction.client.owner_id:
         await interaction.response.send_message("You are not authorized to use this command.", ephemeral=True)
         return
-    
-    try:
-        _, gang_id = resolve_user_preferences(interaction, require_campaign=True, require_gang=True)
-    except MissingPreferenceError as e:
-        await interaction.response.send_message(str(e), ephemeral=True)
-        return
 
-    await interaction.response.send_message(embed=get_credit_history(gang_id, page, limit))
+    embed, view = await get_credit_history(gang_id, limit, interaction.user.id)
+    await interaction.response.send_message(embed=embed, view=view)
 
 @admin_group.command(name="add_asset", description="Add an asset to a gang")
 @app_commands.describe(gang_id="ID of the gang", asset_type="Type of asset", value="Credit value", roll_formula="Dice formula", note="Additional note", should_sell="Mark as to be sold on next payday", is_consumed="Mark as consumed")
@@ -131,11 +197,15 @@ async def add_asset_command(interaction: discord.Interaction, gang_id: int, asse
         return
         
     try:
-        campaign_id, _ = resolve_user_preferences(interaction, require_campaign=True, require_gang=False)
+        campaign_id, _ = await resolve_user_preferences(interaction, require_campaign=True, require_gang=False)
     except MissingPreferenceError as e:
         await interaction.response.send_message(str(e), ephemeral=True)
         return
-    insert_gang_asset(gang_id, name, asset_type, value, roll_formula, is_consumed, should_sell, note)
+    try:
+        await insert_gang_asset(gang_id, name, asset_type, value, roll_formula, is_consumed, should_sell, note)
+    except FormulaError as e:
+        await interaction.response.send_message(f"Invalid roll formula: {e}", ephemeral=True)
+        return
     await interaction.response.send_message(f"Asset '{asset_type}' added to gang {gang_id}.")
 
 @admin_group.command(name="remove_asset", description="Remove an asset from a gang")
@@ -147,11 +217,11 @@ async def remove_asset_command(interaction: discord.Interaction, gang_id: int, a
         return
         
     try:
-        campaign_id, _ = resolve_user_preferences(interaction, require_campaign=True, require_gang=False)
+        campaign_id, _ = await resolve_user_preferences(interaction, require_campaign=True, require_gang=False)
     except MissingPreferenceError as e:
         await interaction.response.send_message(str(e), ephemeral=True)
         return
-    delete_gang_asset(asset_id)
+    await delete_gang_asset(asset_id)
     await interaction.response.send_message(f"Asset ID '{asset_id}' removed from gang {gang_id}.")
 
 def setup(bot):
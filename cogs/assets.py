@@ -2,13 +2,14 @@ import discord
 from discord import app_commands, Interaction
 from discord.ext import commands
 
-from db.gang_assets import (
+from db.aio import (
     insert_gang_asset,
     get_gang_assets_by_campaign,
     get_gang_assets,
     delete_gang_asset,
     update_gang_asset
 )
+from services.dice import FormulaError
 from cogs.autocomplete import (
     resolve_user_preferences,
     MissingPreferenceError,
@@ -65,16 +66,19 @@ async def add_asset_command(
     is_consumed: bool = False
 ):
     try:
-        _, gang_id = resolve_user_preferences(interaction, require_campaign=True, require_gang=True)
+        _, gang_id = await resolve_user_preferences(interaction, require_campaign=True, require_gang=True)
     except MissingPreferenceError as e:
         return await interaction.response.send_message(str(e), ephemeral=True)
 
-    insert_gang_asset(
-        gang_id, name, asset_type,
-        value, roll_formula,
-        is_consumed, should_sell,
-        note
-    )
+    try:
+        await insert_gang_asset(
+            gang_id, name, asset_type,
+            value, roll_formula,
+            is_consumed, should_sell,
+            note
+        )
+    except FormulaError as e:
+        return await interaction.response.send_message(f"❌ Invalid roll formula: {e}", ephemeral=True)
     await interaction.response.send_message(
         f"✅ Added **{asset_type} {name}** to your gang."
     )
@@ -87,11 +91,11 @@ async def add_asset_command(
 @app_commands.autocomplete(asset_id=asset_autocomplete)
 async def remove_asset_command(interaction: Interaction, asset_id: int):
     try:
-        _, gang_id = resolve_user_preferences(interaction, require_campaign=True, require_gang=True)
+        _, gang_id = await resolve_user_preferences(interaction, require_campaign=True, require_gang=True)
     except MissingPreferenceError as e:
         return await interaction.response.send_message(str(e), ephemeral=True)
 
-    delete_gang_asset(asset_id)
+    await delete_gang_asset(asset_id)
     await interaction.response.send_message(f"🗑️ Removed asset **{asset_id}** from your gang.")
 
 @asset_group.command(
@@ -102,11 +106,11 @@ async def remove_asset_command(interaction: Interaction, asset_id: int):
 @app_commands.autocomplete(asset_id=asset_autocomplete)
 async def sell_asset_command(interaction: Interaction, asset_id: int):
     try:
-        _, gang_id = resolve_user_preferences(interaction, require_campaign=True, require_gang=True)
+        _, gang_id = await resolve_user_preferences(interaction, require_campaign=True, require_gang=True)
     except MissingPreferenceError as e:
         return await interaction.response.send_message(str(e), ephemeral=True)
 
-    update_gang_asset(asset_id, should_sell=True)
+    await update_gang_asset(asset_id, should_sell=True)
     await interaction.response.send_message(
         f"💰 Asset **{asset_id}** marked for sale on the next payday."
     )
@@ -117,11 +121,11 @@ async def sell_asset_command(interaction: Interaction, asset_id: int):
 )
 async def list_assets_by_campaign(interaction: Interaction):
     try:
-        campaign_id, _ = resolve_user_preferences(interaction, require_campaign=True, require_gang=False)
+        campaign_id, _ = await resolve_user_preferences(interaction, require_campaign=True, require_gang=False)
     except MissingPreferenceError as e:
         return await interaction.response.send_message(str(e), ephemeral=True)
 
-    rows = get_gang_assets_by_campaign(campaign_id)
+    rows = await get_gang_assets_by_campaign(campaign_id)
     embed = discord.Embed(title="Campaign Assets", color=0x00ff00)
 
     if rows:
@@ -151,11 +155,11 @@ async def list_assets_by_campaign(interaction: Interaction):
 )
 async def list_assets_by_gang(interaction: Interaction):
     try:
-        _, gang_id = resolve_user_preferences(interaction, require_campaign=True, require_gang=True)
+        _, gang_id = await resolve_user_preferences(interaction, require_campaign=True, require_gang=True)
     except MissingPreferenceError as e:
         return await interaction.response.send_message(str(e), ephemeral=True)
 
-    rows = get_gang_assets(gang_id)
+    rows = await get_gang_assets(gang_id)
     embed = discord.Embed(title="Your Gang’s Assets", color=0x00ff00)
 
     if rows:
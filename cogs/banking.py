@@ -3,8 +3,7 @@ import discord
 from discord import app_commands, Interaction
 from discord.ext import commands
 
-from db.banking import log_transaction, get_current_credits, get_transaction_history
-from db.gangs import get_gang_by_id
+from db.aio import log_transaction, get_current_credits, get_transaction_history, get_gang_by_id
 from cogs.autocomplete import resolve_user_preferences, MissingPreferenceError, gang_autocomplete
 
 banking_group = app_commands.Group(name="bank", description="Gang credit management")
@@ -48,34 +47,61 @@ def format_credit_history_embed(
             )
     return embed
 
-def get_credit_history(
-        gang_id: int, 
-        page: int, 
-        limit: int
-    ) -> discord.Embed:
-    page = max(page, 1)
+class CreditHistoryView(discord.ui.View):
+    """
+    Pages through a gang's transaction history with Newer/Older buttons.
+    Keeps the keyset cursor for every page visited so paging back is as
+    cheap as paging forward.
+    """
+    def __init__(self, gang_id: int, gang_name: str, limit: int, owner_id: int):
+        super().__init__(timeout=300)
+        self.gang_id = gang_id
+        self.gang_name = gang_name
+        self.limit = limit
+        self.owner_id = owner_id
+        self.page = 1
+        self.page_cursors = [None] # cursor that starts each visited page
+        self.next_cursor = None
+
+    async def render(self) -> discord.Embed:
+        transactions, self.next_cursor, total_transaction_count, current_credits = await get_transaction_history(
+            self.gang_id, limit=self.limit, cursor=self.page_cursors[self.page - 1]
+        )
+        self.newer_button.disabled = self.page == 1
+        self.older_button.disabled = self.next_cursor is None
+        return format_credit_history_embed(
+            gang_name=self.gang_name,
+            current_credits=current_credits,
+            page=self.page,
+            total_pages=max(math.ceil(total_transaction_count / self.limit), 1),
+            total_transactions_count=total_transaction_count,
+            transactions=transactions
+        )
+
+    async def interaction_check(self, interaction: Interaction) -> bool:
+        return interaction.user.id == self.owner_id
+
+    @discord.ui.button(label="◀ Newer", style=discord.ButtonStyle.secondary)
+    async def newer_button(self, interaction: Interaction, button: discord.ui.Button):
+        self.page = max(self.page - 1, 1)
+        await interaction.response.edit_message(embed=await self.render(), view=self)
+
+    @discord.ui.button(label="Older ▶", style=discord.ButtonStyle.secondary)
+    async def older_button(self, interaction: Interaction, button: discord.ui.Button):
+        del self.page_cursors[self.page:]
+        self.page_cursors.append(self.next_cursor)
+        self.page += 1
+        await interaction.response.edit_message(embed=await self.render(), view=self)
+
+async def get_credit_history(
+        gang_id: int,
+        limit: int,
+        owner_id: int
+    ) -> tuple[discord.Embed, CreditHistoryView]:
     limit = max(min(limit, 50), 1)
-    offset = (page - 1) * limit
-
-    current_total_credits = get_current_credits(gang_id)
-    transactions_page_data, total_transaction_count = get_transaction_history(gang_id,current_total_credits, limit=limit, offset=offset)
-    gang = get_gang_by_id(gang_id) # gang[3] is the gang name
-
-    # Calculate total pages and adjust if current page is out of bounds
-    total_pages = max(math.ceil(total_transaction_count / limit), 1)
-    if page > total_pages:
-        page = total_pages
-        offset = (page - 1) * limit
-        transactions_page_data, _ = get_transaction_history(gang_id, current_total_credits, limit=limit, offset=offset)
-
-    return format_credit_history_embed(
-        gang_name=gang[3],
-        current_credits=current_total_credits,
-        page=page,
-        total_pages=total_pages,
-        total_transactions_count=total_transaction_count,
-        transactions=transactions_page_data
-    )
+    gang = await get_gang_by_id(gang_id) # gang[3] is the gang name
+    view = CreditHistoryView(gang_id, gang[3], limit, owner_id)
+    return await view.render(), view
 
 @banking_group.command(
     name="adjust",
@@ -88,23 +114,23 @@ def get_credit_history(
 async def adjust_credits(interaction: Interaction, amount: int, reason: str = "manual adjustment"):
     try:
         # pulls your saved campaign & gang; errors if you haven’t set them
-        _, gang_id = resolve_user_preferences(interaction, require_campaign=True, require_gang=True)
+        _, gang_id = await resolve_user_preferences(interaction, require_campaign=True, require_gang=True)
     except MissingPreferenceError as e:
         await interaction.response.send_message(str(e), ephemeral=True)
         return
 
-    current = get_current_credits(gang_id)
+    current = await get_current_credits(gang_id)
     if amount < 0 and current < -amount:
-        gang = get_gang_by_id(gang_id)
+        gang = await get_gang_by_id(gang_id)
         await interaction.response.send_message(
             f"❌ Cannot subtract {abs(amount)} credits; **{gang[3]}** only has {current}.",
             ephemeral=True
         )
         return
 
-    log_transaction(gang_id, amount, reason, interaction.user.id)
-    total = get_current_credits(gang_id)
-    gang = get_gang_by_id(gang_id)
+    await log_transaction(gang_id, amount, reason, interaction.user.id)
+    total = await get_current_credits(gang_id)
+    gang = await get_gang_by_id(gang_id)
     verb = "Added" if amount >= 0 else "Subtracted"
     await interaction.response.send_message(
         f"✅ {verb} {abs(amount)} credits "
@@ -118,13 +144,13 @@ async def adjust_credits(interaction: Interaction, amount: int, reason: str = "m
 )
 async def view_credits(interaction: Interaction):
     try:
-        _, gang_id = resolve_user_preferences(interaction, require_campaign=True, require_gang=True)
+        _, gang_id = await resolve_user_preferences(interaction, require_campaign=True, require_gang=True)
     except MissingPreferenceError as e:
         await interaction.response.send_message(str(e), ephemeral=True)
         return
 
-    total = get_current_credits(gang_id)
-    gang = get_gang_by_id(gang_id)
+    total = await get_current_credits(gang_id)
+    gang = await get_gang_by_id(gang_id)
     embed = discord.Embed(
         title=f"{gang[3]} Credits",
         description=f"**{total}** credits",
@@ -137,21 +163,20 @@ async def view_credits(interaction: Interaction):
     description="Show your gang's credit transaction history (paged)"
 )
 @app_commands.describe(
-    page="Which page to view (starting at 1)",
     limit="How many entries per page"
 )
 async def credit_history(
     interaction: Interaction,
-    page: int = 1,
     limit: int = 10
 ):
     try:
-        _, gang_id = resolve_user_preferences(interaction, require_campaign=True, require_gang=True)
+        _, gang_id = await resolve_user_preferences(interaction, require_campaign=True, require_gang=True)
     except MissingPreferenceError as e:
         await interaction.response.send_message(str(e), ephemeral=True)
         return
 
-    await interaction.response.send_message(embed=get_credit_history(gang_id, page, limit))
+    embed, view = await get_credit_history(gang_id, limit, interaction.user.id)
+    await interaction.response.send_message(embed=embed, view=view)
 
 class Banking(commands.Cog):
     def __init__(self, bot):
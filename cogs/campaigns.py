@@ -1,13 +1,18 @@
+import asyncio
 import discord
 from discord.ext import commands
 from discord import app_commands
-from db.campaigns import add_campaign, get_all_campaigns, delete_campaign
+from db.aio import add_campaign, get_all_campaigns, delete_campaign
 from cogs.autocomplete import campaign_autocomplete, gang_autocomplete
-from cogs.dice import Dice
-from cogs.assets import ASSET_COLORS, ASSET_ICONS
-from db.gangs import get_gangs_by_campaign, get_gang_by_id
-from db.gang_assets import get_gang_assets
-from db.banking import log_transaction
+from cogs.assets import ASSET_ICONS
+from db.aio import get_gang_by_id, get_gang_assets, log_transaction, get_payday_assets_by_campaign
+from services.payday import is_payday_asset, project_paydays, roll_asset
+from services.payday_jobs import worker as payday_worker
+
+# Discord's per-message limits
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARS_PER_MESSAGE = 6000
+MAX_FIELDS_PER_EMBED = 25
 
 def format_payday_summary_embed(gang_name: str, summary: list, total: float) -> discord.Embed:
     embed = discord.Embed(
@@ -16,70 +21,90 @@ def format_payday_summary_embed(gang_name: str, summary: list, total: float) ->
         color=0xFFD700  # Gold
     )
 
-    for entry in summary:
+    shown = summary if len(summary) <= MAX_FIELDS_PER_EMBED else summary[:MAX_FIELDS_PER_EMBED - 1]
+    for entry in shown:
         icon = ASSET_ICONS.get(entry["type"], "🔹")
-        color = ASSET_COLORS.get(entry["type"], 0x00ff00)
         embed.add_field(
             name=f"{icon} {entry['name']} ({entry['type']})",
-            color=color,
             value="\n".join(entry["components"]) + f"\n**Subtotal:** {entry['subtotal']} credits",
             inline=False
         )
+    if len(shown) < len(summary):
+        rest = summary[len(shown):]
+        embed.add_field(
+            name=f"➕ {len(rest)} more assets",
+            value=f"**Subtotal:** {sum(entry['subtotal'] for entry in rest)} credits",
+            inline=False
+        )
 
     return embed
 
+def chunk_embeds(embeds):
+    """Groups embeds into lists that fit in one message (10 embeds, 6000 characters)."""
+    chunk = []
+    chars = 0
+    for embed in embeds:
+        size = len(embed)
+        if chunk and (len(chunk) >= MAX_EMBEDS_PER_MESSAGE or chars + size > MAX_EMBED_CHARS_PER_MESSAGE):
+            yield chunk
+            chunk = []
+            chars = 0
+        chunk.append(embed)
+        chars += size
+    if chunk:
+        yield chunk
+
 async def calculate_payday(gang_id: int, user_id: int):
-    assets = get_gang_assets(gang_id)
-    total = 0
+    assets = await get_gang_assets(gang_id)
     summary = []
 
     for asset in assets:
         asset_id, gang_id, name, asset_type, value, formula, is_consumed, should_sell, note, *_ = asset
-        asset_total = 0
-        components = []
-
-        if asset_type in ('Territory', 'Hanger-On', 'Skill', 'Other') or should_sell:
-            if value:
-                asset_total += value
-                components.append(f"Flat: {value}")
-            if formula:
-                result = Dice.roll_formula(formula)
-                asset_total += result["total"]
-                components.append(f"Roll: {result['total']} from {result['original']}")
-
+        if is_payday_asset(asset_type, should_sell):
             # if should_sell:
-                # delete_gang_asset(asset_id)  
-
-            summary.append({
-                "name": name,
-                "type": asset_type,
-                "components": components,
-                "subtotal": asset_total
-            })
-
-            total += asset_total
+                # delete_gang_asset(asset_id)
+            summary.append(roll_asset(name, asset_type, value, formula))
 
-    log_transaction(gang_id, total, "Pay Day", user_id)
+    total = sum(entry["subtotal"] for entry in summary)
+    await log_transaction(gang_id, total, "Pay Day", user_id)
     return total, summary
 
 class Campaigns(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
+    async def cog_load(self):
+        payday_worker.on_progress = self.report_payday_progress
+        await payday_worker.start()
+
+    async def cog_unload(self):
+        await payday_worker.stop()
+
+    async def report_payday_progress(self, job, paid):
+        """Posts the summaries of each batch as soon as it is committed, then updates the progress message."""
+        channel = self.bot.get_channel(job.channel_id) if job.channel_id else None
+        if channel is None:
+            return
+        embeds = (format_payday_summary_embed(p.gang_name, p.summary, p.total) for p in paid)
+        for chunk in chunk_embeds(embeds):
+            await channel.send(embeds=chunk)
+        if job.message_id:
+            await channel.get_partial_message(job.message_id).edit(content=format_job_progress(job))
+
     @commands.command(name='create_campaign')
     async def create_campaign_text(self, ctx, *, name: str):
-        response = add_campaign(name, str(ctx.author.id), str(ctx.guild.id))
+        response = await add_campaign(name, str(ctx.author.id), str(ctx.guild.id))
         await ctx.send(response)
 
 # Slash commands
 @app_commands.command(name="create", description="Create a new campaign")
 async def create_campaign_slash(interaction: discord.Interaction, name: str):
-    response = add_campaign(name, str(interaction.user.id), str(interaction.guild.id))
+    response = await add_campaign(name, str(interaction.user.id), str(interaction.guild.id))
     await interaction.response.send_message(response)
 
 @app_commands.command(name="list", description="List all campaigns")
 async def list_campaigns(interaction: discord.Interaction):
-    campaigns = get_all_campaigns(str(interaction.guild.id))
+    campaigns = await get_all_campaigns(str(interaction.guild.id))
     if campaigns:
         response = "**Campaigns:**\n" + "\n".join([f"ID {cid}: {name}" for cid, name in campaigns])
     else:
@@ -90,33 +115,84 @@ async def list_campaigns(interaction: discord.Interaction):
 @app_commands.describe(campaign_id="ID of the campaign to delete")
 @app_commands.autocomplete(campaign_id=campaign_autocomplete)
 async def delete_campaign_slash(interaction: discord.Interaction, campaign_id: int):
-    response = delete_campaign(campaign_id, str(interaction.user.id), str(interaction.guild.id))
+    response = await delete_campaign(campaign_id, str(interaction.user.id), str(interaction.guild.id))
     await interaction.response.send_message(response)
 
+def format_job_progress(job) -> str:
+    if job.status == 'done':
+        return f"✅ Pay Day `{job.cycle}` for campaign {job.campaign_id} complete: {job.completed_gangs}/{job.total_gangs} gangs processed (job #{job.id})."
+    if job.status == 'failed':
+        return f"❌ Pay Day `{job.cycle}` for campaign {job.campaign_id} stopped at {job.completed_gangs}/{job.total_gangs} gangs: {job.error}. Run the command again to resume (job #{job.id})."
+    filled = round(10 * job.completed_gangs / job.total_gangs) if job.total_gangs else 0
+    return (
+        f"⏳ Pay Day `{job.cycle}` for campaign {job.campaign_id}: "
+        f"{'▰' * filled}{'▱' * (10 - filled)} {job.completed_gangs}/{job.total_gangs} gangs (job #{job.id})"
+    )
+
 @app_commands.command(name="payday_all", description="Apply payday to all gangs in a campaign")
+@app_commands.describe(campaign_id="Campaign to pay", cycle="Payday cycle name (defaults to today's UTC date); each cycle pays out once")
 @app_commands.autocomplete(campaign_id=campaign_autocomplete)
-async def payday_all(interaction: discord.Interaction, campaign_id: int):
-    gangs = get_gangs_by_campaign(campaign_id)
-    if not gangs:
-        await interaction.response.send_message("No gangs found for this campaign.", ephemeral=True)
-        return
-
-    embeds = []
-    for gang_id, _, _, gang_name, *_ in gangs:
-        total, summary = await calculate_payday(gang_id, interaction.user.id)
-        embeds.append(format_payday_summary_embed(gang_name, summary, total))
-
-    # Discord.py lets you send multiple embeds at once
-    await interaction.response.send_message(embeds=embeds)
+async def payday_all(interaction: discord.Interaction, campaign_id: int, cycle: str = None):
+    await interaction.response.defer(thinking=True)
+    progress = await interaction.followup.send("⏳ Queuing Pay Day…", wait=True)
+    job, created = await payday_worker.submit(campaign_id, interaction.user.id, cycle, interaction.channel_id, progress.id)
+    if job is None:
+        await progress.edit(content="No gangs found for this campaign.")
+    elif not created and job.status == 'failed':
+        await progress.edit(content=f"🔁 Resuming Pay Day `{job.cycle}` for campaign {campaign_id} from {job.completed_gangs}/{job.total_gangs} gangs (job #{job.id}).")
+    elif not created:
+        await progress.edit(content=f"Pay Day `{job.cycle}` for campaign {campaign_id} was already requested (job #{job.id}, {job.status}); no credits were paid again.")
 
 @app_commands.command(name="payday_one", description="Apply payday to a single gang")
 @app_commands.autocomplete(campaign_id=campaign_autocomplete, gang_id=gang_autocomplete)
 async def payday_one(interaction: discord.Interaction, campaign_id: int, gang_id: int):
-    g = get_gang_by_id(campaign_id)
+    g = await get_gang_by_id(campaign_id)
     total, summary = await calculate_payday(gang_id, interaction.user.id)
     embed = format_payday_summary_embed(g[3], summary, total)
     await interaction.response.send_message(embed=embed)
 
+@app_commands.command(name="payday_projection", description="Simulate paydays for a campaign without paying out")
+@app_commands.describe(campaign_id="Campaign to project", simulations="Number of simulated paydays")
+@app_commands.autocomplete(campaign_id=campaign_autocomplete)
+async def payday_projection(interaction: discord.Interaction, campaign_id: int, simulations: app_commands.Range[int, 100, 100_000] = 100_000):
+    rows = await get_payday_assets_by_campaign(campaign_id)
+    if not rows:
+        await interaction.response.send_message("No gangs found for this campaign.", ephemeral=True)
+        return
+
+    loop = asyncio.get_running_loop()
+    gangs, campaign, skipped = await loop.run_in_executor(None, project_paydays, rows, simulations)
+    embed = format_projection_embed(campaign_id, simulations, gangs, campaign, skipped)
+    await interaction.response.send_message(embed=embed)
+
+def format_projection_embed(campaign_id: int, simulations: int, gangs: list, campaign, skipped: list) -> discord.Embed:
+    embed = discord.Embed(
+        title=f"📈 Pay Day Projection for Campaign {campaign_id}",
+        description=f"Based on {simulations:,} simulated paydays. Nothing has been paid out.",
+        color=0xFFD700
+    )
+
+    def describe(projection):
+        p = projection.percentiles
+        return (
+            f"Expected **{projection.mean:.0f}** ± {projection.std:.0f} credits\n"
+            f"Median {p[50]:g} | 5–95%: {p[5]:g}–{p[95]:g}"
+        )
+
+    embed.add_field(name="🏛️ Whole Campaign", value=describe(campaign), inline=False)
+    # Discord allows 25 fields per embed
+    for projection in gangs[:24]:
+        embed.add_field(name=projection.name, value=describe(projection), inline=False)
+    if len(gangs) > 24 or skipped:
+        notes = []
+        if len(gangs) > 24:
+            notes.append(f"{len(gangs) - 24} more gangs not shown")
+        if skipped:
+            notes.append(f"Skipped invalid formulas: {', '.join(sorted(set(skipped)))}")
+        embed.set_footer(text=". ".join(notes))
+
+    return embed
+
 # Grouping
 campaign_group = app_commands.Group(name="campaign", description="Campaign related commands")
 campaign_group.add_command(create_campaign_slash)
@@ -124,6 +200,7 @@ campaign_group.add_command(list_campaigns)
 campaign_group.add_command(delete_campaign_slash)
 campaign_group.add_command(payday_all)
 campaign_group.add_command(payday_one)
+campaign_group.add_command(payday_projection)
 
 def setup(bot):
     bot.add_cog(Campaigns(bot))
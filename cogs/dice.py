@@ -1,10 +1,9 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-import random
-import re
-import ast
-import operator
+import asyncio
+from services.dice import compile_formula, normalize_formula, FormulaError
+from services.dice_stats import formula_distribution, Distribution, PERCENTILES
 from typing import TypedDict, List, Union, Optional
 
 class RollResultSuccess(TypedDict):
@@ -37,59 +36,61 @@ async def roll_slash(interaction: discord.Interaction, formula: str):
     result = Dice.roll_formula(formula)
     await interaction.response.send_message(embed=Dice.format_rolls_embed([result]))
 
+@app_commands.command(name="stats", description="Show the exact odds of a dice formula (e.g., d3x10)")
+async def stats_slash(interaction: discord.Interaction, formula: str):
+    loop = asyncio.get_running_loop()
+    try:
+        distribution = await loop.run_in_executor(None, formula_distribution, formula)
+    except FormulaError as e:
+        await interaction.response.send_message(f"❌ Error: {e}", ephemeral=True)
+        return
+    await interaction.response.send_message(embed=format_stats_embed(normalize_formula(formula), distribution))
+
 # Slash command group (optional if more dice commands are added later)
 dice_group = app_commands.Group(name="dice", description="Dice rolling commands")
 dice_group.add_command(roll_slash)
+dice_group.add_command(stats_slash)
 
-# Static method for shared formula logic
-@staticmethod
-def roll_formula_static(formula: str) -> RollResult:
-    rolls_log = []
+# Distributions with at most this many outcomes are listed in full.
+MAX_LISTED_OUTCOMES = 20
+# Embed descriptions are capped at 4096 characters; titles at only 256.
+MAX_SHOWN_FORMULA_LENGTH = 4000
 
-    def roll_dice(match):
-        num = int(match.group(1)) if match.group(1) else 1
-        sides = int(match.group(2))
-        rolls = [random.randint(1, sides) for _ in range(num)]
-        rolls_log.append(f"{num}d{sides}: {rolls}")
-        return f"({'+'.join(map(str, rolls))})"
+def format_stats_embed(formula: str, distribution: Distribution) -> discord.Embed:
+    shown = formula if len(formula) <= MAX_SHOWN_FORMULA_LENGTH else formula[:MAX_SHOWN_FORMULA_LENGTH - 1] + "…"
+    embed = discord.Embed(
+        title="Dice Stats",
+        description=f"```{shown.replace('`', '')}```",
+        color=discord.Color.purple()
+    )
+    embed.add_field(name="Mean", value=f"{distribution.mean:.2f}")
+    embed.add_field(name="Std Dev", value=f"{distribution.variance ** 0.5:.2f}")
+    embed.add_field(name="Variance", value=f"{distribution.variance:.2f}")
+    embed.add_field(name="Range", value=f"{distribution.values[0]:g} to {distribution.values[-1]:g}")
+    embed.add_field(
+        name="Percentiles",
+        value=" | ".join(f"p{q}: {distribution.percentile(q):g}" for q in PERCENTILES),
+        inline=False
+    )
 
-    formula = formula.lower().replace(" ", "").replace("x", "*")
-    parsed_formula = re.sub(r"(\d*)d(\d+)", roll_dice, formula)
+    if len(distribution.values) <= MAX_LISTED_OUTCOMES:
+        peak = distribution.probs.max()
+        lines = [
+            f"{value:>6g} {prob * 100:6.2f}% {'█' * max(1, round(prob / peak * 20))}"
+            for value, prob in zip(distribution.values, distribution.probs)
+        ]
+        embed.add_field(name="Distribution", value="```\n" + "\n".join(lines) + "\n```", inline=False)
 
-    try:
-        node = ast.parse(parsed_formula, mode='eval')
-
-        def eval_expr(expr):
-            if isinstance(expr, ast.Expression):
-                return eval_expr(expr.body)
-            elif isinstance(expr, ast.BinOp):
-                left = eval_expr(expr.left)
-                right = eval_expr(expr.right)
-                ops = {
-                    ast.Add: operator.add,
-                    ast.Sub: operator.sub,
-                    ast.Mult: operator.mul,
-                    ast.Div: operator.truediv,
-                }
-                return ops[type(expr.op)](left, right)
-            elif isinstance(expr, ast.Num):
-                return expr.n
-            elif isinstance(expr, ast.UnaryOp) and isinstance(expr.op, ast.USub):
-                return -eval_expr(expr.operand)
-            else:
-                raise ValueError("Unsupported operation")
-
-        total = eval_expr(node)
-        return {
-            "original": formula,
-            "parsed": parsed_formula,
-            "rolls": rolls_log,
-            "total": total
-        }
+    return embed
 
+# Static method for shared formula logic
+@staticmethod
+def roll_formula_static(formula: str) -> RollResult:
+    try:
+        return compile_formula(formula).roll()
     except Exception as e:
         return {
-            "original": formula,
+            "original": normalize_formula(formula),
             "parsed": "",
             "rolls": [],
             "total": 0,
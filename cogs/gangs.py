@@ -1,7 +1,10 @@
+import asyncio
 import discord
 from discord.ext import commands
 from discord import app_commands
-from db.gangs import add_gang, get_gangs_by_campaign, get_gangs_by_user, delete_gang
+from db.aio import add_gang, get_gangs_by_campaign, get_gangs_by_user, delete_gang, get_campaign_owner
+from services.yaktribe import parse_gang_url, parse_gang_page, fetch_gang_page
+from services.gang_sync import sync_campaign_gangs
 from cogs.autocomplete import campaign_autocomplete, gang_autocomplete
 
 gang_group = app_commands.Group(name="gang", description="Gang related commands")
@@ -13,13 +16,68 @@ class Gangs(commands.Cog):
 @gang_group.command(name="register", description="Register your gang to a campaign")
 @app_commands.autocomplete(campaign_id=campaign_autocomplete)
 async def register_gang_slash(interaction: discord.Interaction, campaign_id: int, yaktribe_url: str):
-    response = add_gang(str(interaction.user.id), campaign_id, yaktribe_url)
-    await interaction.response.send_message(response)
+    if parse_gang_url(yaktribe_url) is None:
+        await interaction.response.send_message("Invalid Yaktribe URL. Please use the correct format.")
+        return
+
+    # Yaktribe can take longer than the 3 second interaction deadline.
+    await interaction.response.defer(thinking=True)
+    try:
+        html, _ = await fetch_gang_page(yaktribe_url)
+        data = await asyncio.get_running_loop().run_in_executor(None, parse_gang_page, html)
+    except Exception as e:
+        await interaction.followup.send(f"Failed to fetch or parse Yaktribe data: {e}")
+        return
+
+    response = await add_gang(str(interaction.user.id), campaign_id, yaktribe_url, data)
+    await interaction.followup.send(response)
+
+@gang_group.command(name="sync_all", description="Refresh every gang in a campaign from Yaktribe")
+@app_commands.autocomplete(campaign_id=campaign_autocomplete)
+async def sync_all_gangs(interaction: discord.Interaction, campaign_id: int):
+    owner = await get_campaign_owner(campaign_id, str(interaction.guild.id))
+    if owner is None:
+        await interaction.response.send_message("Campaign not found.", ephemeral=True)
+        return
+    if owner != str(interaction.user.id):
+        await interaction.response.send_message("Only the campaign's creator can sync its gangs.", ephemeral=True)
+        return
+
+    await interaction.response.defer(thinking=True)
+    try:
+        result = await sync_campaign_gangs(campaign_id)
+    except Exception as e:
+        await interaction.followup.send(f"Failed to sync gangs for Campaign ID `{campaign_id}`: {e}")
+        return
+
+    total = len(result.updated) + len(result.unchanged) + len(result.failed)
+    if not total:
+        await interaction.followup.send(f"No gangs found for Campaign ID `{campaign_id}`.")
+        return
+
+    embed = discord.Embed(
+        title=f"Yaktribe Sync - Campaign {campaign_id}",
+        description=f"{len(result.updated)} updated, {len(result.unchanged)} unchanged, {len(result.failed)} failed",
+        color=discord.Color.red() if result.failed else discord.Color.green()
+    )
+    if result.updated:
+        embed.add_field(
+            name="Updated",
+            value="\n".join(f"**{name}** (`{gid}`): {', '.join(fields)}" for gid, name, fields in result.updated)[:1024],
+            inline=False
+        )
+    if result.failed:
+        embed.add_field(
+            name="Failed",
+            value="\n".join(f"**{name}** (`{gid}`): {error}" for gid, name, error in result.failed)[:1024],
+            inline=False
+        )
+    await interaction.followup.send(embed=embed)
 
 @gang_group.command(name="list", description="List all gangs in a campaign")
 @app_commands.autocomplete(campaign_id=campaign_autocomplete)
 async def list_gangs(interaction: discord.Interaction, campaign_id: int):
-    gangs = get_gangs_by_campaign(campaign_id)
+    gangs = await get_gangs_by_campaign(campaign_id)
 
     if gangs:
         embed = discord.Embed(
@@ -45,12 +103,12 @@ async def list_gangs(interaction: discord.Interaction, campaign_id: int):
 @gang_group.command(name="delete", description="Delete one of your gangs")
 @app_commands.autocomplete(campaign_id=campaign_autocomplete, gang_id=gang_autocomplete)
 async def delete_gang_slash(interaction: discord.Interaction, campaign_id: int, gang_id: int):
-    response = delete_gang(gang_id, str(interaction.user.id))
+    response = await delete_gang(gang_id, str(interaction.user.id))
     await interaction.response.send_message(response)
 
 @gang_group.command(name="mine", description="List all gangs you've registered across campaigns")
 async def list_user_gangs(interaction: discord.Interaction):
-    gangs = get_gangs_by_user(str(interaction.user.id))
+    gangs = await get_gangs_by_user(str(interaction.user.id))
 
     if gangs:
         embed = discord.Embed(
@@ -1,94 +1,23 @@
 from collections import defaultdict
-from datetime import datetime
+import os
+from datetime import datetime, timedelta
 import discord
-import pandas as pd
 from discord import app_commands, Interaction
-from discord.ext import commands
-from db.campaigns import get_campaign
-from db.gangs import get_gang_by_id
-from db.marketplace import save_market_data, get_market_data, create_trade_offer, accept_trade_offer, get_trade_offers_by_campaign
+from discord.ext import commands, tasks
+from db.aio import get_campaign, get_gang_by_id, save_market_data, get_market_data, get_market_generated_at, find_campaigns_stocking, create_trade_offer, accept_trade_offer, get_trade_offers_by_campaign, expire_trade_offers
+from db.cache import MISSING
+from db.marketplace import market_embed_cache
 from cogs.autocomplete import gang_autocomplete, resolve_user_preferences, MissingPreferenceError
+from services.catalog import get_catalog
+from services.market import sample_market, rotate_markets
 
 marketplace_group = app_commands.Group(name="marketplace", description="Marketplace management commands")
 
-TRADING_POST_CSV = "./Trading Post.csv"
-df = pd.read_csv(TRADING_POST_CSV, encoding='utf-8-sig')
-
-def parse_rarity_rating(value):
-    if isinstance(value, str):
-        value = value.strip().upper()
-        if value == "C":
-            return 0
-        if value[0] in ("R", "I"):
-            try:
-                return int(value[1:])
-            except ValueError:
-                return None
-    return None
-
-df_clean = df.dropna(subset=["Name", "Category", "Rarity", "Rarity Rating", "Cost"]).copy()
-df_clean["Parsed Rarity"] = df_clean["Rarity Rating"].apply(parse_rarity_rating)
-df_clean = df_clean.dropna(subset=["Parsed Rarity"])
-
-def generate_market_data():
-    categories = df_clean["Category"].unique()
-    trading_post = []
-
-    # Ensure at least one item per category
-    for category in categories:
-        items = df_clean[df_clean["Category"] == category]
-        item = weighted_choice(items)
-        if item is not None:
-            trading_post.append(item)
-
-    # Fill the rest to make 20 unique entries
-    selected_names = {item['Name'] for item in trading_post}
-    attempts = 0
-    while len(trading_post) < 20 and attempts < 1000:
-        item = weighted_choice(df_clean)
-        attempts += 1
-        if item and item['Name'] not in selected_names:
-            trading_post.append(item)
-            selected_names.add(item['Name'])
-
-    if len(trading_post) < 20:
-        print(f"Only generated {len(trading_post)} items after {attempts} attempts")
-
-    # Secret Stash: 5 unique items with Rarity/Illegal >= 10
-    stash_pool = df_clean[df_clean["Parsed Rarity"] >= 10]
-    stash_items = []
-    stash_selected = set()
-    stash_attempts = 0
-    while len(stash_items) < 5 and stash_attempts < 500:
-        if stash_pool.empty:
-            break
-        item = stash_pool.sample(1).iloc[0]
-        stash_attempts += 1
-        if item["Name"] not in stash_selected:
-            stash_items.append(item_to_dict(item))
-            stash_selected.add(item["Name"])
-
-    return trading_post, stash_items
-
-def weighted_choice(df):
-    try:
-        weights = df["Parsed Rarity"].apply(lambda r: 1 / (r + 1)).tolist()
-        if sum(weights) == 0:
-            return None
-        item = df.sample(weights=weights).iloc[0]
-        return item_to_dict(item)
-    except Exception as e:
-        print(f"weighted_choice error: {e}")
-        return None
-
-def item_to_dict(row):
-    return {
-        "Name": row["Name"],
-        "Category": row["Category"],
-        "Rarity": row["Rarity"],
-        "Rarity Rating": row["Rarity Rating"],
-        "Cost": row["Cost"]
-    }
+# Pending trade offers older than this are expired by the sweeper.
+TRADE_OFFER_TTL_HOURS = float(os.getenv("TRADE_OFFER_TTL_HOURS", "168"))
+
+def generate_market_data(rng=None):
+    return sample_market(get_catalog(), rng)
 
 MAX_FIELD_VALUE_LENGTH = 1024
 # A bit of buffer to account for newlines and " (Cont.)" in title, etc.
@@ -190,16 +119,78 @@ def add_section_to_embed(
 
         embed.add_field(name=field_name_to_add, value=field_value_str, inline=False)
 
+def render_market_embed(campaign_id, trading_post_items, secret_stash_items, generated_at) -> discord.Embed:
+    embed = discord.Embed(
+        title=f"Marketplace - Campaign {campaign_id}",
+        color=discord.Color.dark_magenta() 
+    )
+
+    if generated_at:
+        if isinstance(generated_at, datetime):
+            embed.description = f"Last Updated: {discord.utils.format_dt(generated_at, style='R')} ({discord.utils.format_dt(generated_at, style='F')})"
+        else:
+            embed.set_footer(text=f"Generated: {str(generated_at)}")
+    else:
+        embed.set_footer(text="Update time not available")
+
+    # Add Trading Post items to embed
+    add_section_to_embed(
+        embed,
+        trading_post_items,
+        "🛒 Trading Post",
+        empty_section_message_suffix="the Trading Post"
+    )
+
+    # Add Secret Stash items to embed
+    add_section_to_embed(
+        embed,
+        secret_stash_items,
+        "🤫 Secret Stash",
+        empty_section_message_suffix="the Secret Stash"
+    )
+    
+    if len(embed.fields) > 25:
+        print(f"Warning: Embed for campaign {campaign_id} has {len(embed.fields)} fields, max is 25.")
+
+    return embed
+
 class Marketplace(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
+    async def cog_load(self):
+        self.rotate_markets_task.start()
+        self.expire_trades.start()
+
+    async def cog_unload(self):
+        self.rotate_markets_task.cancel()
+        self.expire_trades.cancel()
+
+    @tasks.loop(minutes=15)
+    async def rotate_markets_task(self):
+        try:
+            rotated = await rotate_markets()
+            if rotated:
+                print(f"Rotated {rotated} campaign markets.")
+        except Exception as e:
+            print(f"Error rotating markets: {e}")
+
+    @tasks.loop(hours=1)
+    async def expire_trades(self):
+        try:
+            cutoff = (datetime.utcnow() - timedelta(hours=TRADE_OFFER_TTL_HOURS)).isoformat()
+            expired = await expire_trade_offers(cutoff)
+            if expired:
+                print(f"Expired {expired} stale trade offers.")
+        except Exception as e:
+            print(f"Error expiring trade offers: {e}")
+
 @marketplace_group.command(name="generate", description="Generate the trading post and secret stash")
 async def generate_market(interaction: Interaction):
     try:
-        campaign_id, _ = resolve_user_preferences(interaction, require_campaign=True, require_gang=False)
+        campaign_id, _ = await resolve_user_preferences(interaction, require_campaign=True, require_gang=False)
         trading_post, secret_stash = generate_market_data()
-        save_market_data(campaign_id, trading_post, secret_stash)
+        await save_market_data(campaign_id, trading_post, secret_stash)
         await interaction.response.send_message(f"Marketplace generated for campaign {campaign_id} with {len(trading_post)} trading items and {len(secret_stash)} secret stash items.")
     except MissingPreferenceError as e:
         await interaction.response.send_message(str(e), ephemeral=True)
@@ -207,47 +198,27 @@ async def generate_market(interaction: Interaction):
 @marketplace_group.command(name="view", description="View the current trading post and secret stash")
 async def view_market(interaction: Interaction):
     try:
-        campaign_id, _ = resolve_user_preferences(interaction, require_campaign=True, require_gang=False)
-        trading_post_items, secret_stash_items, generated_at = get_market_data(campaign_id)
-
-        if trading_post_items is None and secret_stash_items is None:
+        campaign_id, _ = await resolve_user_preferences(interaction, require_campaign=True, require_gang=False)
+        generated_at = await get_market_generated_at(campaign_id)
+        if generated_at is None:
             await interaction.response.send_message(
                 f"No marketplace data found for Campaign {campaign_id}.",
                 ephemeral=True
             )
             return
 
-        embed = discord.Embed(
-            title=f"Marketplace - Campaign {campaign_id}",
-            color=discord.Color.dark_magenta() 
-        )
-
-        if generated_at:
-            if isinstance(generated_at, datetime):
-                embed.description = f"Last Updated: {discord.utils.format_dt(generated_at, style='R')} ({discord.utils.format_dt(generated_at, style='F')})"
-            else:
-                embed.set_footer(text=f"Generated: {str(generated_at)}")
-        else:
-            embed.set_footer(text="Update time not available")
-
-        # Add Trading Post items to embed
-        add_section_to_embed(
-            embed,
-            trading_post_items,
-            "🛒 Trading Post",
-            empty_section_message_suffix="the Trading Post"
-        )
-
-        # Add Secret Stash items to embed
-        add_section_to_embed(
-            embed,
-            secret_stash_items,
-            "🤫 Secret Stash",
-            empty_section_message_suffix="the Secret Stash"
-        )
-        
-        if len(embed.fields) > 25:
-            print(f"Warning: Embed for campaign {campaign_id} has {len(embed.fields)} fields, max is 25.")
+        payload = market_embed_cache.get((campaign_id, generated_at))
+        if payload is MISSING:
+            trading_post_items, secret_stash_items, generated_at = await get_market_data(campaign_id)
+            if trading_post_items is None and secret_stash_items is None:
+                await interaction.response.send_message(
+                    f"No marketplace data found for Campaign {campaign_id}.",
+                    ephemeral=True
+                )
+                return
+            payload = render_market_embed(campaign_id, trading_post_items, secret_stash_items, generated_at).to_dict()
+            market_embed_cache.set((campaign_id, generated_at), payload)
+        embed = discord.Embed.from_dict(payload)
 
         await interaction.response.send_message(embed=embed) # Or ephemeral=True
 
@@ -261,29 +232,105 @@ async def view_market(interaction: Interaction):
             ephemeral=True
         )
 
+# Keeps each line, and so the up to 25 results, under Discord's 2000 characters
+MAX_FIND_LINE_LENGTH = 76
+FIND_SECTIONS = {"trading_post": "🛒 Trading Post", "secret_stash": "🤫 Secret Stash"}
+
+def format_find_line(campaign_id: int, campaign_name: str, section: str, item_name: str) -> str:
+    line = f"- **{item_name}** in {FIND_SECTIONS[section]} of Campaign {campaign_id} ({campaign_name})"
+    if len(line) > MAX_FIND_LINE_LENGTH:
+        line = line[:MAX_FIND_LINE_LENGTH - 1] + "…"
+    return line
+
+@marketplace_group.command(name="find", description="Find which campaign markets stock an item")
+@app_commands.describe(item="Item name (or part of it)")
+async def find_item(interaction: Interaction, item: str):
+    rows = await find_campaigns_stocking(interaction.guild.id, item)
+    if not rows:
+        await interaction.response.send_message(f"No markets on this server stock anything matching **{item}**.", ephemeral=True)
+        return
+    await interaction.response.send_message("\n".join(format_find_line(*row) for row in rows))
+
 @marketplace_group.command(name="trade", description="Create a trade offer")
-@app_commands.describe(to_gang_id="Target Gang ID", offered_assets="Assets offered (comma-separated)", offered_credits="Credits offered", requested_assets="Assets requested (comma-separated)", requested_credits="Credits requested")
+@app_commands.describe(to_gang_id="Target Gang ID", offered_assets="Asset IDs offered (comma-separated)", offered_credits="Credits offered", requested_assets="Asset IDs requested (comma-separated)", requested_credits="Credits requested")
 @app_commands.autocomplete(to_gang_id=gang_autocomplete)
 async def make_offer(interaction: Interaction, to_gang_id: int, offered_assets: str = None, offered_credits: int = 0, requested_assets: str = None, requested_credits: int = 0):
+    if offered_credits < 0 or requested_credits < 0:
+        await interaction.response.send_message("Offered and requested credits can't be negative.", ephemeral=True)
+        return
     try:
-        campaign_id, from_gang_id = resolve_user_preferences(interaction)
-        offer_id = create_trade_offer(campaign_id, from_gang_id, to_gang_id, offered_assets or "", offered_credits, requested_assets or "", requested_credits)
+        campaign_id, from_gang_id = await resolve_user_preferences(interaction)
+        offer_id = await create_trade_offer(campaign_id, from_gang_id, to_gang_id, offered_assets or "", offered_credits, requested_assets or "", requested_credits)
         await interaction.response.send_message(f"Trade offer #{offer_id} created from gang {from_gang_id} to gang {to_gang_id}.")
     except MissingPreferenceError as e:
         await interaction.response.send_message(str(e), ephemeral=True)
 
-@marketplace_group.command(name="list_trades", description="List all trade offers in the current campaign")
-async def list_offers(interaction: Interaction):
-    try:
-        campaign_id, _ = resolve_user_preferences(interaction, require_campaign=True, require_gang=False)
-        offers = get_trade_offers_by_campaign(campaign_id)
+TRADE_STATUS_CHOICES = [
+    app_commands.Choice(name="Open", value="pending"),
+    app_commands.Choice(name="Accepted", value="accepted"),
+    app_commands.Choice(name="Expired", value="expired"),
+]
+# Keeps each line, and so a page of 10, well under Discord's 2000 characters
+MAX_OFFER_LINE_LENGTH = 180
+
+def format_trade_offer_line(offer: dict) -> str:
+    line = f"ID {offer['id']}: Gang {offer['from_gang_id']} offers [{offer['offered_assets']}] + {offer['offered_credits']} credits to Gang {offer['to_gang_id']} for [{offer['requested_assets']}] + {offer['requested_credits']} credits — {offer['status']}"
+    if len(line) > MAX_OFFER_LINE_LENGTH:
+        line = line[:MAX_OFFER_LINE_LENGTH - 1] + "…"
+    return line
+
+class TradeOffersView(discord.ui.View):
+    """
+    Pages through a campaign's trade offers with Newer/Older buttons,
+    keeping the keyset cursor of every visited page like CreditHistoryView.
+    """
+    def __init__(self, campaign_id: int, status: str, owner_id: int, limit: int = 10):
+        super().__init__(timeout=300)
+        self.campaign_id = campaign_id
+        self.status = status
+        self.owner_id = owner_id
+        self.limit = limit
+        self.page = 1
+        self.page_cursors = [None]
+        self.next_cursor = None
+
+    async def render(self) -> str:
+        offers, self.next_cursor = await get_trade_offers_by_campaign(
+            self.campaign_id, self.status, before_id=self.page_cursors[self.page - 1], limit=self.limit
+        )
+        self.newer_button.disabled = self.page == 1
+        self.older_button.disabled = self.next_cursor is None
         if not offers:
-            await interaction.response.send_message("No trade offers available.")
-            return
-        message = "**Trade Offers:**\n"
-        for offer in offers:
-            message += f"ID {offer['id']}: Gang {offer['from_gang_id']} offers [{offer['offered_assets']}] + {offer['offered_credits']} credits to Gang {offer['to_gang_id']} for [{offer['requested_assets']}] + {offer['requested_credits']} credits — {offer['status']}\n"
-        await interaction.response.send_message(message)
+            return "No trade offers available."
+        return f"**Trade Offers ({self.status}) — page {self.page}:**\n" + "\n".join(map(format_trade_offer_line, offers))
+
+    async def interaction_check(self, interaction: Interaction) -> bool:
+        return interaction.user.id == self.owner_id
+
+    @discord.ui.button(label="◀ Newer", style=discord.ButtonStyle.secondary)
+    async def newer_button(self, interaction: Interaction, button: discord.ui.Button):
+        self.page = max(self.page - 1, 1)
+        await interaction.response.edit_message(content=await self.render(), view=self)
+
+    @discord.ui.button(label="Older ▶", style=discord.ButtonStyle.secondary)
+    async def older_button(self, interaction: Interaction, button: discord.ui.Button):
+        del self.page_cursors[self.page:]
+        self.page_cursors.append(self.next_cursor)
+        self.page += 1
+        await interaction.response.edit_message(content=await self.render(), view=self)
+
+@marketplace_group.command(name="list_trades", description="List trade offers in the current campaign")
+@app_commands.describe(status="Which offers to show (default: open)")
+@app_commands.choices(status=TRADE_STATUS_CHOICES)
+async def list_offers(interaction: Interaction, status: app_commands.Choice[str] = None):
+    try:
+        campaign_id, _ = await resolve_user_preferences(interaction, require_campaign=True, require_gang=False)
+        view = TradeOffersView(campaign_id, status.value if status else "pending", interaction.user.id)
+        content = await view.render()
+        if view.next_cursor is None:
+            await interaction.response.send_message(content)
+        else:
+            await interaction.response.send_message(content, view=view)
     except MissingPreferenceError as e:
         await interaction.response.send_message(str(e), ephemeral=True)
 
@@ -291,14 +338,14 @@ async def list_offers(interaction: Interaction):
 @app_commands.describe(offer_id="ID of the offer to accept")
 async def accept_offer_cmd(interaction: Interaction, offer_id: int):
     try:
-        _, to_gang_id = resolve_user_preferences(interaction, require_campaign=False)
+        _, to_gang_id = await resolve_user_preferences(interaction, require_campaign=False)
         user_id = str(interaction.user.id)
-        owner_id = get_gang_by_id(to_gang_id)[2]
+        owner_id = (await get_gang_by_id(to_gang_id))[2]
         if user_id != owner_id:
             await interaction.response.send_message("You do not own the target gang and cannot accept this trade.", ephemeral=True)
             return
-        result = accept_trade_offer(offer_id)
-        await interaction.response.send_message(result)
+        accepted, message = await accept_trade_offer(offer_id, to_gang_id, interaction.user.id)
+        await interaction.response.send_message(message, ephemeral=not accepted)
     except MissingPreferenceError as e:
         await interaction.response.send_message(str(e), ephemeral=True)
 
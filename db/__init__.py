@@ -1,107 +1,80 @@
-import sqlite3
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from db.pool import ConnectionPool
 
 DB_FILE = 'necromunda.db'
-SCHEMA_VERSION = 1
+DB_WORKERS = 4
+DB_POOL_SIZE = 8
 
-def get_connection():
-    return sqlite3.connect(DB_FILE)
+_executor = None
+_pool = None
+_pool_lock = threading.Lock()
 
-def get_schema_version(conn):
-    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
-    cursor = conn.execute("SELECT value FROM meta WHERE key = 'schema_version'")
-    row = cursor.fetchone()
-    return int(row[0]) if row else 0
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.path != DB_FILE:
+            if _pool is not None:
+                _pool.close()
+            _pool = ConnectionPool(
+                DB_FILE,
+                max_size=DB_POOL_SIZE,
+                track_stacks=bool(os.getenv("DB_TRACK_LEAKS")),
+            )
+        return _pool
 
-def set_schema_version(conn, version):
-    conn.execute("REPLACE INTO meta (key, value) VALUES ('schema_version', ?)", (str(version),))
+def get_connection():
+    """Checks a connection out of the pool. `close()` returns it to the pool."""
+    return get_pool().acquire()
 
-def init_db():
+def checkpoint():
+    """Folds the WAL back into the main database file, e.g. before copying it."""
     conn = get_connection()
-    version = get_schema_version(conn)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
 
-    if version < 1:
-        conn.execute('''CREATE TABLE IF NOT EXISTS campaigns (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            created_by TEXT NOT NULL,
-            server_id TEXT NOT NULL
-        )''')
-        conn.execute('''CREATE TABLE IF NOT EXISTS gangs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT NOT NULL,
-            campaign_id INTEGER NOT NULL,
-            yaktribe_url TEXT NOT NULL,
-            gang_name TEXT,
-            gang_type TEXT,
-            credits INTEGER,
-            meat INTEGER,
-            gang_rating INTEGER,
-            reputation INTEGER,
-            wealth INTEGER,
-            gangers TEXT,
-            FOREIGN KEY (campaign_id) REFERENCES campaigns (id)
-        )''')
-        conn.execute('''CREATE TABLE IF NOT EXISTS gang_transactions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            gang_id INTEGER NOT NULL,
-            change INTEGER NOT NULL,
-            reason TEXT,
-            user_id INTEGER,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (gang_id) REFERENCES gangs (id)
-        )''')
-        conn.execute('''CREATE TABLE IF NOT EXISTS gang_assets (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            gang_id INTEGER NOT NULL,
-            name TEXT NOT NULL,
-            asset_type TEXT CHECK(asset_type IN ('Territory', 'Hanger-On', 'Skill', 'Equipment', 'Captive', 'Other')) NOT NULL,
-            static_value INTEGER,
-            roll_formula TEXT,
-            is_consumed BOOLEAN DEFAULT 0,
-            should_sell BOOLEAN DEFAULT 0,
-            note TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (gang_id) REFERENCES gangs (id)
-        )''')
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS campaign_market (
-                campaign_id INTEGER PRIMARY KEY,
-                generated_at TEXT NOT NULL,
-                trading_post TEXT NOT NULL,
-                secret_stash TEXT NOT NULL,
-                FOREIGN KEY (campaign_id) REFERENCES campaigns(id)
-            )
-        ''')
-        conn.execute('CREATE INDEX IF NOT EXISTS idx_campaign_market_generated_at ON campaign_market (generated_at)')
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS trade_offers (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                from_gang_id INTEGER NOT NULL,
-                to_gang_id INTEGER NOT NULL,
-                campaign_id INTEGER NOT NULL,
-                offered_assets TEXT,
-                offered_credits INTEGER DEFAULT 0,
-                requested_assets TEXT,
-                requested_credits INTEGER DEFAULT 0,
-                status TEXT DEFAULT 'pending',
-                FOREIGN KEY (from_gang_id) REFERENCES gangs(id),
-                FOREIGN KEY (to_gang_id) REFERENCES gangs(id),
-                FOREIGN KEY (campaign_id) REFERENCES campaigns(id)
-            )
-        ''')
-        conn.execute('CREATE INDEX IF NOT EXISTS idx_trade_offers_campaign_id ON trade_offers (campaign_id)')
-        conn.execute('CREATE INDEX IF NOT EXISTS idx_trade_offers_to_gang_id ON trade_offers (to_gang_id)')
-        conn.execute('CREATE INDEX IF NOT EXISTS idx_trade_offers_from_gang_id ON trade_offers (from_gang_id)')
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS user_preferences (
-                user_id TEXT PRIMARY KEY,
-                current_campaign_id INTEGER,
-                current_gang_id INTEGER,
-                FOREIGN KEY (current_campaign_id) REFERENCES campaigns(id),
-                FOREIGN KEY (current_gang_id) REFERENCES gangs(id)
-            )
-        ''')
-        set_schema_version(conn, 1)
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="db")
+    return _executor
+
+async def run_db(func, *args, **kwargs):
+    """Runs a blocking db function on the db executor so it never stalls the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
 
-    conn.commit()
+def init_db():
+    """Applies any pending schema migrations and refreshes catalog_items from the Trading Post CSV."""
+    from db.migrations import run_migrations
+    conn = get_connection()
+    run_migrations(conn)
+    with conn:
+        _seed_catalog_items(conn)
     conn.close()
+
+def _seed_catalog_items(conn):
+    from db.marketplace import sync_catalog_items
+    from services.catalog import get_catalog
+    try:
+        items = get_catalog().items
+    except OSError as e:
+        print(f"Warning: could not refresh catalog_items from the Trading Post CSV: {e}")
+        return
+    sync_catalog_items(conn, [item.to_dict() for item in items])
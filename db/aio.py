@@ -0,0 +1,94 @@
+"""
+Awaitable versions of every db function.
+
+Each wrapper runs the synchronous implementation on the db executor (see
+`db.run_db`), so cogs can `await` database work without blocking the
+discord.py event loop. Small hot writes go through the group-commit write
+queue (see `db.writer`) instead and are awaited through its futures.
+"""
+import asyncio
+import functools
+from db import run_db, banking, campaigns, gang_assets, gangs, marketplace, payday_jobs, user_preferences, yaktribe_pages
+
+def _awaitable(func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_db(func, *args, **kwargs)
+    return wrapper
+
+def _queued(submit):
+    """
+    Wraps a `submit_*` function so the caller awaits its group-commit future
+    without tying up a db worker. The write is shielded: cancelling the
+    caller (e.g. at shutdown) doesn't drop a write that is already queued.
+    """
+    @functools.wraps(submit)
+    async def wrapper(*args, **kwargs):
+        return await asyncio.shield(asyncio.wrap_future(submit(*args, **kwargs)))
+    return wrapper
+
+# Banking
+log_transaction = _queued(banking.submit_log_transaction)
+get_current_credits = _awaitable(banking.get_current_credits)
+get_transaction_history = _awaitable(banking.get_transaction_history)
+verify_balances = _awaitable(banking.verify_balances)
+
+# Campaigns
+add_campaign = _awaitable(campaigns.add_campaign)
+delete_campaign = _awaitable(campaigns.delete_campaign)
+get_all_campaigns = _awaitable(campaigns.get_all_campaigns)
+get_campaign = _awaitable(campaigns.get_campaign)
+get_campaign_owner = _awaitable(campaigns.get_campaign_owner)
+search_campaigns = _awaitable(campaigns.search_campaigns)
+
+# Gangs
+add_gang = _awaitable(gangs.add_gang)
+delete_gang = _awaitable(gangs.delete_gang)
+get_gang_by_id = _awaitable(gangs.get_gang_by_id)
+get_gangs_by_campaign = _awaitable(gangs.get_gangs_by_campaign)
+get_gangs_by_user = _awaitable(gangs.get_gangs_by_user)
+search_gangs = _awaitable(gangs.search_gangs)
+get_gang_stats_by_campaign = _awaitable(gangs.get_gang_stats_by_campaign)
+update_gang_stats = _awaitable(gangs.update_gang_stats)
+
+# Gang assets
+insert_gang_asset = _queued(gang_assets.submit_insert_gang_asset)
+get_gang_assets = _awaitable(gang_assets.get_gang_assets)
+update_gang_asset = _queued(gang_assets.submit_update_gang_asset)
+delete_gang_asset = _awaitable(gang_assets.delete_gang_asset)
+get_gang_assets_by_campaign = _awaitable(gang_assets.get_gang_assets_by_campaign)
+get_payday_assets_by_campaign = _awaitable(gang_assets.get_payday_assets_by_campaign)
+search_gang_assets = _awaitable(gang_assets.search_gang_assets)
+
+# Marketplace
+save_market_data = _queued(marketplace.submit_save_market_data)
+save_market_data_bulk = _awaitable(marketplace.save_market_data_bulk)
+get_campaigns_due_for_rotation = _awaitable(marketplace.get_campaigns_due_for_rotation)
+get_market_data = _awaitable(marketplace.get_market_data)
+get_market_generated_at = _awaitable(marketplace.get_market_generated_at)
+find_campaigns_stocking = _awaitable(marketplace.find_campaigns_stocking)
+create_trade_offer = _awaitable(marketplace.create_trade_offer)
+get_trade_offer = _awaitable(marketplace.get_trade_offer)
+accept_trade_offer = _awaitable(marketplace.accept_trade_offer)
+get_trade_offers_by_campaign = _awaitable(marketplace.get_trade_offers_by_campaign)
+expire_trade_offers = _awaitable(marketplace.expire_trade_offers)
+
+# Payday jobs
+create_payday_job = _awaitable(payday_jobs.create_payday_job)
+get_payday_job = _awaitable(payday_jobs.get_payday_job)
+get_unfinished_payday_jobs = _awaitable(payday_jobs.get_unfinished_payday_jobs)
+get_pending_job_gangs = _awaitable(payday_jobs.get_pending_job_gangs)
+complete_job_gangs = _awaitable(payday_jobs.complete_job_gangs)
+skip_job_gangs = _awaitable(payday_jobs.skip_job_gangs)
+set_payday_job_message = _awaitable(payday_jobs.set_payday_job_message)
+finish_payday_job = _awaitable(payday_jobs.finish_payday_job)
+get_payday_job_results = _awaitable(payday_jobs.get_payday_job_results)
+
+# User preferences
+set_user_preferences = _awaitable(user_preferences.set_user_preferences)
+get_user_preferences = _awaitable(user_preferences.get_user_preferences)
+
+# Yaktribe page cache
+save_page = _awaitable(yaktribe_pages.save_page)
+touch_page = _awaitable(yaktribe_pages.touch_page)
+get_cached_page = _awaitable(yaktribe_pages.get_cached_page)
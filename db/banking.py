@@ -1,102 +1,134 @@
 from datetime import datetime,timezone
+from typing import NamedTuple, Optional
+from concurrent.futures import Future
 from db import get_connection
+from db.writer import submit_write
+
+def _insert_transaction(conn, gang_id, change, reason, user_id):
+    conn.execute("INSERT INTO gang_transactions (gang_id, change, reason, user_id) VALUES (?, ?, ?, ?)", (gang_id, change, reason, user_id))
+
+def submit_log_transaction(gang_id: int, change: int, reason: str, user_id: int) -> Future:
+    """Queues a ledger row on the group-commit write queue; the future resolves once it is committed."""
+    return submit_write(_insert_transaction, gang_id, change, reason, user_id)
 
 def log_transaction(gang_id: int, change: int, reason: str, user_id: int):
+    submit_log_transaction(gang_id, change, reason, user_id).result()
+
+def get_current_credits(gang_id: int) -> int:
+    """Reads the gang's balance from gang_balances, which the ledger trigger keeps current."""
     conn = get_connection()
     c = conn.cursor()
-    c.execute("INSERT INTO gang_transactions (gang_id, change, reason, user_id) VALUES (?, ?, ?, ?)", (gang_id, change, reason, user_id))
-    conn.commit()
+    c.execute("SELECT balance FROM gang_balances WHERE gang_id = ?", (gang_id,))
+    row = c.fetchone()
     conn.close()
+    return row[0] if row else 0
 
-def get_current_credits(gang_id: int) -> int:
+def verify_balances(rebuild: bool = False) -> list[tuple[int, int, int]]:
+    """
+    Checks every materialized balance against the sum of its ledger.
+
+    Args:
+        rebuild: If True and any balance disagrees, recompute gang_balances
+                 from gang_transactions in the same transaction.
+
+    Returns:
+        List of (gang_id, stored_balance, ledger_balance) for every mismatch found.
+    """
     conn = get_connection()
     c = conn.cursor()
-    c.execute("SELECT SUM(change) FROM gang_transactions WHERE gang_id = ?", (gang_id,))
-    total = c.fetchone()[0]
+    c.execute("BEGIN IMMEDIATE")
+    c.execute("""
+        SELECT l.gang_id, COALESCE(b.balance, 0), l.total
+        FROM (
+            SELECT gang_id, SUM(change) AS total, COUNT(*) AS tx_count
+            FROM gang_transactions
+            GROUP BY gang_id
+        ) l
+        LEFT JOIN gang_balances b ON b.gang_id = l.gang_id
+        WHERE COALESCE(b.balance, 0) != l.total
+           OR COALESCE(b.transaction_count, 0) != l.tx_count
+        UNION ALL
+        SELECT b.gang_id, b.balance, 0
+        FROM gang_balances b
+        WHERE (b.balance != 0 OR b.transaction_count != 0)
+          AND NOT EXISTS (SELECT 1 FROM gang_transactions t WHERE t.gang_id = b.gang_id)
+    """)
+    mismatches = c.fetchall()
+
+    if rebuild and mismatches:
+        c.execute("DELETE FROM gang_balances")
+        c.execute("""
+            INSERT INTO gang_balances (gang_id, balance, transaction_count)
+            SELECT gang_id, SUM(change), COUNT(*) FROM gang_transactions GROUP BY gang_id
+        """)
+    conn.commit()
     conn.close()
-    return total if total is not None else 0
+    return mismatches
+
+class HistoryCursor(NamedTuple):
+    """Position after the last row of a history page: that row's key and the balance before it."""
+    timestamp: str
+    id: int
+    balance: int
 
 def get_transaction_history(
     gang_id: int,
-    overall_current_credits: int,
     limit: int = 10,
-    offset: int = 0
-) -> tuple[list[tuple[any, int, str, int]], int]:
+    cursor: Optional[HistoryCursor] = None
+) -> tuple[list[tuple[any, int, str, int]], Optional[HistoryCursor], int, int]:
     """
-    Fetches a paginated list of transactions for a gang, including a calculated
-    running total (balance after each transaction) for display.
+    Fetches one page of a gang's transactions, newest first, using keyset
+    pagination on (timestamp, id) so every page costs the same as the first.
+
+    The running total is carried in the cursor: the first page starts from the
+    materialized balance, and each following page starts from the balance
+    before the oldest transaction of the previous one.
 
     Args:
         gang_id: The ID of the gang.
-        overall_current_credits: The gang's absolute current total credits.
         limit: Number of transactions per page.
-        offset: Offset for pagination ( (page - 1) * limit ).
+        cursor: The `next_cursor` returned for the previous page, or None for
+                the newest page.
 
     Returns:
         A tuple containing:
-        - page_transactions_with_rt: List of tuples:
+        - history: List of tuples:
           (timestamp_dt, change, reason, running_total_after_this_transaction).
-          Transactions are ordered newest first.
+        - next_cursor: Cursor for the next (older) page, or None if this is the last one.
         - total_transactions_count: Total number of transactions for the gang.
+        - current_credits: The gang's current balance.
     """
-    conn = get_connection() # Your actual database connection function
+    conn = get_connection()
     c = conn.cursor()
 
-    sum_of_changes_on_newer_pages = 0
-    if offset > 0:
-        c.execute(
-            """
-            SELECT COALESCE(SUM(change), 0)
-            FROM (
-                SELECT change
-                FROM gang_transactions
-                WHERE gang_id = ?
-                ORDER BY timestamp DESC
-                LIMIT ?  -- This limit is the 'offset' value
-            ) AS newer_transactions;
-            """,
-            (gang_id, offset)
-        )
-        sum_row = c.fetchone()
-        if sum_row:
-            sum_of_changes_on_newer_pages = sum_row[0]
-
-    page_start_ref_balance = overall_current_credits - sum_of_changes_on_newer_pages
-    query = """
-    WITH PagedTransactions AS (
-        SELECT
-            timestamp,
-            change,
-            reason,
-            -- Sum of 'change' for rows from the start of this page's result set (newest)
-            -- up to 1 row PRECEDING the current row within this page's result set.
-            COALESCE(
-                SUM(change) OVER (ORDER BY timestamp DESC ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING),
-                0
-            ) AS sum_of_prior_changes_on_page
-        FROM gang_transactions
-        WHERE gang_id = :gang_id
-        ORDER BY timestamp DESC
-        LIMIT :limit OFFSET :offset
-    )
-    SELECT
-        timestamp,
-        change,
-        reason,
-        -- Calculate the balance AFTER the current transaction
-        (:page_start_ref_balance - sum_of_prior_changes_on_page) AS running_total_after_transaction
-    FROM PagedTransactions;
-    """
-    c.execute(query, {
-        "gang_id": gang_id,
-        "limit": limit,
-        "offset": offset,
-        "page_start_ref_balance": page_start_ref_balance
-    })
-    raw_page_data_with_rt = c.fetchall()
+    c.execute("SELECT balance, transaction_count FROM gang_balances WHERE gang_id = ?", (gang_id,))
+    row = c.fetchone()
+    current_credits, total_transactions_count = row if row else (0, 0)
+
+    # Fetch one extra row to learn whether an older page exists.
+    if cursor is None:
+        running_total = current_credits
+        c.execute("""
+            SELECT id, timestamp, change, reason
+            FROM gang_transactions
+            WHERE gang_id = ?
+            ORDER BY timestamp DESC, id DESC
+            LIMIT ?
+        """, (gang_id, limit + 1))
+    else:
+        running_total = cursor.balance
+        c.execute("""
+            SELECT id, timestamp, change, reason
+            FROM gang_transactions
+            WHERE gang_id = ? AND (timestamp, id) < (?, ?)
+            ORDER BY timestamp DESC, id DESC
+            LIMIT ?
+        """, (gang_id, cursor.timestamp, cursor.id, limit + 1))
+    rows = c.fetchall()
+    conn.close()
 
     history: list[tuple[any, int, str, int]] = []
-    for ts_str, change_val, reason_str, rt_after_tx in raw_page_data_with_rt:
+    for tx_id, ts_str, change_val, reason_str in rows[:limit]:
         try:
             # Assuming timestamp_str is 'YYYY-MM-DD HH:MM:SS' and stored in UTC
             dt_naive = datetime.strptime(ts_str, "%Y-%m-%d %H:%M:%S")
@@ -106,17 +138,13 @@ def get_transaction_history(
             print(f"Warning: Could not parse timestamp '{ts_str}' for gang {gang_id}: {e}")
             timestamp_dt = datetime.min.replace(tzinfo=timezone.utc) # Fallback
         history.append(
-            (timestamp_dt, change_val, reason_str, rt_after_tx)
+            (timestamp_dt, change_val, reason_str, running_total)
         )
+        running_total -= change_val
 
-    # Step 4: Get the total count of transactions for this gang for pagination
-    c.execute(
-        "SELECT COUNT(*) FROM gang_transactions WHERE gang_id = ?",
-        (gang_id,)
-    )
-    count_row = c.fetchone()
-    total_transactions_count = count_row[0] if count_row else 0
-
-    conn.close()
+    next_cursor = None
+    if len(rows) > limit:
+        last_id, last_ts, *_ = rows[limit - 1]
+        next_cursor = HistoryCursor(last_ts, last_id, running_total)
 
-    return history, total_transactions_count
\ No newline at end of file
+    return history, next_cursor, total_transactions_count, current_credits
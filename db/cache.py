@@ -0,0 +1,72 @@
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+# Every cache registers itself here so /admin db_stats can report on all of them.
+CACHES = {}
+
+class LRUCache:
+    """
+    A thread-safe LRU cache with a per-entry time-to-live.
+
+    Used for hot entity lookups (user preferences, gangs, campaigns). Writers
+    call `invalidate` for the keys they touch; the TTL bounds staleness from
+    anything that changes the database behind the bot's back.
+    """
+    def __init__(self, name, maxsize=1024, ttl=300.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        CACHES[name] = self
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidate_matching(self, predicate):
+        """Drops every entry whose key satisfies `predicate`."""
+        with self._lock:
+            for key in [key for key in self._data if predicate(key)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+def cache_stats():
+    return {name: cache.stats() for name, cache in CACHES.items()}
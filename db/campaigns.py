@@ -1,11 +1,19 @@
 from db import get_connection
+from db.cache import LRUCache, MISSING
+from db.search import SearchIndexes
+
+_campaign_cache = LRUCache("campaigns", maxsize=1024, ttl=300.0)
+_campaign_search = SearchIndexes(lambda server_id: [(cid, name, None) for cid, name in get_all_campaigns(server_id)])
 
 def add_campaign(name: str, user_id: str, server_id: str) -> str:
     conn = get_connection()
     c = conn.cursor()
     c.execute('INSERT INTO campaigns (name, created_by, server_id) VALUES (?, ?, ?)', (name, user_id, server_id))
+    campaign_id = c.lastrowid
     conn.commit()
     conn.close()
+    _campaign_cache.invalidate(str(campaign_id))
+    _campaign_search.add(server_id, campaign_id, name)
     return f"Campaign '{name}' created successfully."
 
 def delete_campaign(campaign_id: int, user_id: str, server_id: str) -> str:
@@ -22,8 +30,19 @@ def delete_campaign(campaign_id: int, user_id: str, server_id: str) -> str:
     c.execute('DELETE FROM campaigns WHERE id = ?', (campaign_id,))
     conn.commit()
     conn.close()
+    _campaign_cache.invalidate(str(campaign_id))
+    _campaign_search.remove(server_id, campaign_id)
     return f"Campaign {campaign_id} deleted successfully."
 
+def get_campaign_owner(campaign_id: int, server_id: str):
+    """Returns the user ID that created the campaign, or None if it isn't a campaign on this server."""
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute('SELECT created_by FROM campaigns WHERE id = ? AND server_id = ?', (campaign_id, server_id))
+    row = c.fetchone()
+    conn.close()
+    return row[0] if row else None
+
 def get_all_campaigns(server_id: str):
     conn = get_connection()
     c = conn.cursor()
@@ -33,9 +52,19 @@ def get_all_campaigns(server_id: str):
     return campaigns
 
 def get_campaign(campaign_id: str):
+    campaign = _campaign_cache.get(str(campaign_id))
+    if campaign is not MISSING:
+        return campaign
+
     conn = get_connection()
     c = conn.cursor()
     c.execute('SELECT id, name FROM campaigns WHERE id = ?', (campaign_id,))
     campaign = c.fetchone()
     conn.close()
-    return campaign
\ No newline at end of file
+    if campaign:
+        _campaign_cache.set(str(campaign_id), campaign)
+    return campaign
+
+def search_campaigns(server_id: str, query: str, limit: int = 25):
+    """Returns up to `limit` (id, name) campaigns on the server matching `query`, best matches first."""
+    return [(cid, name) for cid, name, _ in _campaign_search.search(server_id, query, limit)]
@@ -1,14 +1,26 @@
+from concurrent.futures import Future
 from db import get_connection
+from db.writer import submit_write, after_commit
+from db.search import SearchIndexes
+from services.dice import validate_formula
 
-def insert_gang_asset(gang_id, name, asset_type, static_value=None, roll_formula=None, is_consumed=False, should_sell=False, note=None):
-    conn = get_connection()
-    sql = '''INSERT INTO gang_assets (gang_id, name, asset_type, static_value, roll_formula, is_consumed, should_sell, note)
-             VALUES (?, ?, ?, ?, ?, ?, ?, ?)'''
-    cur = conn.cursor()
-    cur.execute(sql, (gang_id, name, asset_type, static_value, roll_formula, is_consumed, should_sell, note))
-    conn.commit()
+_asset_search = SearchIndexes(lambda gang_id: [(a[0], a[2], a[3]) for a in get_gang_assets(gang_id)])
+
+def _insert_gang_asset(conn, gang_id, name, asset_type, static_value, roll_formula, is_consumed, should_sell, note):
+    cur = conn.execute('''INSERT INTO gang_assets (gang_id, name, asset_type, static_value, roll_formula, is_consumed, should_sell, note)
+             VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', (gang_id, name, asset_type, static_value, roll_formula, is_consumed, should_sell, note))
     return cur.lastrowid
 
+def submit_insert_gang_asset(gang_id, name, asset_type, static_value=None, roll_formula=None, is_consumed=False, should_sell=False, note=None) -> Future:
+    """Queues the insert on the group-commit write queue; the future resolves to the new asset id once committed."""
+    validate_formula(roll_formula)
+    future = submit_write(_insert_gang_asset, gang_id, name, asset_type, static_value, roll_formula, is_consumed, should_sell, note)
+    after_commit(future, lambda asset_id: _asset_search.add(gang_id, asset_id, name, asset_type))
+    return future
+
+def insert_gang_asset(gang_id, name, asset_type, static_value=None, roll_formula=None, is_consumed=False, should_sell=False, note=None):
+    return submit_insert_gang_asset(gang_id, name, asset_type, static_value, roll_formula, is_consumed, should_sell, note).result()
+
 def get_gang_assets(gang_id):
     conn = get_connection()
     cur = conn.cursor()
@@ -16,21 +28,45 @@ def get_gang_assets(gang_id):
     SELECT id, gang_id, name, asset_type, static_value, 
         roll_formula, is_consumed, should_sell, note 
     FROM gang_assets WHERE gang_id = ?""", (gang_id,))
-    return cur.fetchall()
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+def _update_gang_asset(conn, asset_id, fields):
+    row = conn.execute('SELECT gang_id FROM gang_assets WHERE id = ?', (asset_id,)).fetchone()
+    assignments = ', '.join(f"{key} = ?" for key in fields)
+    conn.execute(f'UPDATE gang_assets SET {assignments} WHERE id = ?', [*fields.values(), asset_id])
+    return row[0] if row else None
+
+def submit_update_gang_asset(asset_id, **kwargs) -> Future:
+    """Queues the update on the group-commit write queue; the future resolves once committed."""
+    validate_formula(kwargs.get('roll_formula'))
+    future = submit_write(_update_gang_asset, asset_id, kwargs)
+
+    def refresh_search(old_gang_id):
+        if old_gang_id is not None and kwargs.keys() & {'name', 'asset_type', 'gang_id'}:
+            _asset_search.discard_scope(old_gang_id)
+            if 'gang_id' in kwargs:
+                _asset_search.discard_scope(kwargs['gang_id'])
+    after_commit(future, refresh_search)
+    return future
 
 def update_gang_asset(asset_id, **kwargs):
-    conn = get_connection()
-    fields = ', '.join(f"{key} = ?" for key in kwargs)
-    values = list(kwargs.values())
-    values.append(asset_id)
-    sql = f'UPDATE gang_assets SET {fields} WHERE id = ?'
-    conn.execute(sql, values)
-    conn.commit()
+    submit_update_gang_asset(asset_id, **kwargs).result()
 
 def delete_gang_asset(asset_id):
     conn = get_connection()
+    row = conn.execute('SELECT gang_id FROM gang_assets WHERE id = ?', (asset_id,)).fetchone()
     conn.execute('DELETE FROM gang_assets WHERE id = ?', (asset_id,))
     conn.commit()
+    conn.close()
+    if row:
+        _asset_search.remove(row[0], int(asset_id))
+
+def discard_asset_scopes(*gang_ids):
+    """Drops the search indexes of gangs whose assets were changed in bulk."""
+    for gang_id in gang_ids:
+        _asset_search.discard_scope(gang_id)
 
 def get_gang_assets_by_campaign(campaign_id):
     conn = get_connection()
@@ -43,4 +79,28 @@ def get_gang_assets_by_campaign(campaign_id):
     """, (campaign_id,))
     rows = c.fetchall()
     conn.close()
-    return rows
\ No newline at end of file
+    return rows
+
+def search_gang_assets(gang_id, query, asset_type=None, limit=25):
+    """Returns up to `limit` (id, name, asset_type) assets of the gang matching `query`, best matches first."""
+    predicate = (lambda t: t == asset_type) if asset_type else None
+    return _asset_search.search(gang_id, query, limit, predicate)
+
+def get_payday_assets_by_campaign(campaign_id):
+    """
+    Returns (gang_id, gang_name, asset_name, asset_type, static_value, roll_formula, should_sell)
+    for every gang in the campaign, ordered by gang. Gangs without assets
+    appear once with the asset columns NULL.
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("""
+        SELECT g.id, g.gang_name, ga.name, ga.asset_type, ga.static_value, ga.roll_formula, ga.should_sell
+        FROM gangs g
+        LEFT JOIN gang_assets ga ON ga.gang_id = g.id
+        WHERE g.campaign_id = ?
+        ORDER BY g.id, ga.id
+    """, (campaign_id,))
+    rows = c.fetchall()
+    conn.close()
+    return rows
@@ -1,68 +1,20 @@
-from bs4 import BeautifulSoup
-import re
-import requests
 import json
 from db import get_connection
+from db.cache import LRUCache, MISSING
+from db.search import SearchIndexes
 
-def parse_gang_page(html):
-    soup = BeautifulSoup(html, 'html.parser')
-
-    # Gang name
-    name_tag = soup.select_one("tr.subheader td[colspan='2']")
-    name = name_tag.get_text(strip=True) if name_tag else "Unknown"
-
-    # Gang info table
-    gang_info = {}
-    for row in soup.select("table")[1].select("tr")[1:]:
-        if row.th and row.td:
-            label = row.th.get_text(strip=True).rstrip(":")
-            value = row.td.get_text(strip=True)
-            gang_info[label] = value
-
-    gang_type = gang_info.get("Gang Type", "Unknown")
-    credits = int(gang_info.get("Credits", "0"))
-    meat = int(gang_info.get("Meat", "0"))
-    rating = int(gang_info.get("Gang Rating", "0"))
-    rep = int(gang_info.get("Reputation", "0"))
-    wealth = int(gang_info.get("Wealth", "0"))
-
-    # Gangers
-    gangers = []
-    for fighter_row in soup.select("table")[5].select("tr")[1:]:
-        name_cell = fighter_row.select_one("td:nth-of-type(2)")
-        if name_cell:
-            name_parts = name_cell.decode_contents().split("<br>")
-            fighter_name = name_parts[0].strip()
-            gangers.append(fighter_name)
-
-    return {
-        "name": name,
-        "type": gang_type,
-        "credits": credits,
-        "meat": meat,
-        "rating": rating,
-        "rep": rep,
-        "wealth": wealth,
-        "gangers": gangers
-    }
-
-def add_gang(user_id: str, campaign_id: int, yaktribe_url: str) -> str:
-    match = re.match(r'https://yaktribe\.games/underhive/print/gang/(\d+)\?.*', yaktribe_url)
-    if not match:
-        return "Invalid Yaktribe URL. Please use the correct format."
-
-    try:
-        html = requests.get(yaktribe_url).text
-        data = parse_gang_page(html)
-    except Exception as e:
-        return f"Failed to fetch or parse Yaktribe data: {e}"
+_gang_cache = LRUCache("gangs", maxsize=2048, ttl=300.0)
+_gang_search = SearchIndexes(lambda campaign_id: [(g[0], g[3], None) for g in get_gangs_by_campaign(campaign_id)])
 
+def add_gang(user_id: str, campaign_id: int, yaktribe_url: str, data: dict) -> str:
+    """Registers a gang from its already fetched and parsed Yaktribe data (see services.yaktribe.parse_gang_page)."""
     conn = get_connection()
     c = conn.cursor()
     c.execute('SELECT name FROM campaigns WHERE id = ?', (campaign_id,))
     campaign = c.fetchone()
 
     if not campaign:
+        conn.close()
         return "Campaign ID not found."
 
     c.execute('''
@@ -74,15 +26,18 @@ def add_gang(user_id: str, campaign_id: int, yaktribe_url: str) -> str:
         data['meat'], data['rating'], data['rep'],
         data['wealth'], json.dumps(data['gangers'])
     ))
+    gang_id = c.lastrowid
     conn.commit()
     conn.close()
+    _gang_cache.invalidate(str(gang_id))
+    _gang_search.add(campaign_id, gang_id, data['name'])
 
     return f"Gang '{data['name']}' registered to campaign '{campaign[0]}' successfully."
 
 def delete_gang(gang_id: int, user_id: str) -> str:
     conn = get_connection()
     c = conn.cursor()
-    c.execute('SELECT user_id FROM gangs WHERE id = ?', (gang_id,))
+    c.execute('SELECT user_id, campaign_id FROM gangs WHERE id = ?', (gang_id,))
     row = c.fetchone()
     if not row:
         conn.close()
@@ -93,14 +48,21 @@ def delete_gang(gang_id: int, user_id: str) -> str:
     c.execute('DELETE FROM gangs WHERE id = ?', (gang_id,))
     conn.commit()
     conn.close()
+    _gang_cache.invalidate(str(gang_id))
+    _gang_search.remove(row[1], gang_id)
     return f"Gang {gang_id} deleted successfully."
 
 def get_gang_by_id(gang_id: int):
+    gang = _gang_cache.get(str(gang_id))
+    if gang is not MISSING:
+        return gang
+
     conn = get_connection()
     c = conn.cursor()
     c.execute('SELECT id, yaktribe_url, user_id, gang_name, gang_type FROM gangs WHERE id = ?', (gang_id,))
     gangs = c.fetchall()
     conn.close()
+    _gang_cache.set(str(gang_id), gangs[0])
     return gangs[0]
 
 def get_gangs_by_campaign(campaign_id: int):
@@ -111,6 +73,62 @@ def get_gangs_by_campaign(campaign_id: int):
     conn.close()
     return gangs
   
+# Maps the keys produced by services.yaktribe.parse_gang_page to gangs columns.
+GANG_STAT_COLUMNS = {
+    "name": "gang_name",
+    "type": "gang_type",
+    "credits": "credits",
+    "meat": "meat",
+    "rating": "gang_rating",
+    "rep": "reputation",
+    "wealth": "wealth",
+    "gangers": "gangers",
+}
+
+def get_gang_stats_by_campaign(campaign_id: int) -> list[dict]:
+    """Returns every gang in the campaign with its Yaktribe URL and stored stats, keyed like parse_gang_page output."""
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute(f'''
+        SELECT id, yaktribe_url, {", ".join(GANG_STAT_COLUMNS.values())}
+        FROM gangs WHERE campaign_id = ?
+    ''', (campaign_id,))
+    rows = c.fetchall()
+    conn.close()
+
+    gangs = []
+    for gang_id, yaktribe_url, *values in rows:
+        stats = dict(zip(GANG_STAT_COLUMNS, values))
+        stats["gangers"] = json.loads(stats["gangers"]) if stats["gangers"] else []
+        gangs.append({"id": gang_id, "yaktribe_url": yaktribe_url, "campaign_id": campaign_id, "stats": stats})
+    return gangs
+
+def update_gang_stats(campaign_id: int, updates: list[tuple[int, dict]]):
+    """
+    Writes refreshed Yaktribe stats for several gangs in one transaction.
+
+    Args:
+        campaign_id: The campaign the gangs belong to.
+        updates: List of (gang_id, data) where data is parse_gang_page output.
+    """
+    if not updates:
+        return
+    columns = list(GANG_STAT_COLUMNS.values())
+    rows = [
+        tuple(json.dumps(data[key]) if key == "gangers" else data[key] for key in GANG_STAT_COLUMNS) + (gang_id,)
+        for gang_id, data in updates
+    ]
+    conn = get_connection()
+    conn.executemany(
+        f"UPDATE gangs SET {', '.join(f'{col} = ?' for col in columns)} WHERE id = ?",
+        rows
+    )
+    conn.commit()
+    conn.close()
+    for gang_id, data in updates:
+        _gang_cache.invalidate(str(gang_id))
+        _gang_search.add(campaign_id, gang_id, data["name"])
+
 def get_gangs_by_user(user_id: str):
     conn = get_connection()
     c = conn.cursor()
@@ -124,3 +142,6 @@ def get_gangs_by_user(user_id: str):
     conn.close()
     return gangs
 
+def search_gangs(campaign_id: int, query: str, limit: int = 25):
+    """Returns up to `limit` (id, gang_name) gangs in the campaign matching `query`, best matches first."""
+    return [(gid, name) for gid, name, _ in _gang_search.search(campaign_id, query, limit)]
@@ -1,44 +1,163 @@
+from concurrent.futures import Future
 from db import get_connection
-import json
+from db.writer import submit_write, after_commit
+from db.cache import LRUCache
+from db.gang_assets import discard_asset_scopes
+from collections import Counter
 from datetime import datetime
 
+# Finished /marketplace view embeds, keyed by (campaign_id, generated_at), so a
+# market is rendered once per generation. Saving a market drops its entries.
+market_embed_cache = LRUCache("market_embeds", maxsize=512, ttl=3600.0)
+
+def _invalidate_market_embeds(campaign_ids):
+    campaign_ids = set(campaign_ids)
+    market_embed_cache.invalidate_matching(lambda key: key[0] in campaign_ids)
+
+MARKET_SECTIONS = ("trading_post", "secret_stash")
+
+UPSERT_CATALOG_ITEM_SQL = """
+    INSERT INTO catalog_items (id, name, category, rarity, rarity_rating, cost)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        name=excluded.name,
+        category=excluded.category,
+        rarity=excluded.rarity,
+        rarity_rating=excluded.rarity_rating,
+        cost=excluded.cost
+"""
+
+UPSERT_MARKET_SQL = """
+    INSERT INTO campaign_market (campaign_id, generated_at)
+    VALUES (?, ?)
+    ON CONFLICT(campaign_id) DO UPDATE SET generated_at=excluded.generated_at
+"""
+
+def sync_catalog_items(conn, items):
+    """Upserts market item dicts (as produced by CatalogItem.to_dict) into catalog_items on `conn`."""
+    conn.executemany(UPSERT_CATALOG_ITEM_SQL, [
+        (item["id"], item["Name"], item["Category"], item.get("Rarity"), item.get("Rarity Rating"), item.get("Cost"))
+        for item in items
+    ])
+
+def _market_item_rows(campaign_id, trading_post, secret_stash):
+    counts = Counter()
+    for section, items in zip(MARKET_SECTIONS, (trading_post, secret_stash)):
+        for item in items:
+            counts[(campaign_id, section, item["id"])] += 1
+    return [(campaign_id, section, item_id, quantity) for (campaign_id, section, item_id), quantity in counts.items()]
+
+def _write_markets(conn, markets, generated_at):
+    # The catalog can be reloaded while the bot runs, so make sure every
+    # referenced item exists in catalog_items before pointing at it.
+    items = {item["id"]: item for _, trading_post, secret_stash in markets for item in (*trading_post, *secret_stash)}
+    sync_catalog_items(conn, items.values())
+    conn.executemany(UPSERT_MARKET_SQL, [(campaign_id, generated_at) for campaign_id, _, _ in markets])
+    conn.executemany("DELETE FROM campaign_market_items WHERE campaign_id = ?", [(campaign_id,) for campaign_id, _, _ in markets])
+    conn.executemany(
+        "INSERT INTO campaign_market_items (campaign_id, section, catalog_item_id, quantity) VALUES (?, ?, ?, ?)",
+        [row for market in markets for row in _market_item_rows(*market)]
+    )
+
+def submit_save_market_data(campaign_id, trading_post, secret_stash) -> Future:
+    """Queues the market on the group-commit write queue; the future resolves once committed."""
+    future = submit_write(_write_markets, [(campaign_id, trading_post, secret_stash)], datetime.utcnow().isoformat())
+    after_commit(future, lambda _: _invalidate_market_embeds([campaign_id]))
+    return future
+
 def save_market_data(campaign_id, trading_post, secret_stash):
+    submit_save_market_data(campaign_id, trading_post, secret_stash).result()
+
+def save_market_data_bulk(markets):
+    """
+    Writes many markets in one transaction, with one executemany per statement.
+
+    Args:
+        markets: List of (campaign_id, trading_post, secret_stash).
+    """
+    if not markets:
+        return
+    conn = get_connection()
+    with conn:
+        _write_markets(conn, markets, datetime.utcnow().isoformat())
+    conn.close()
+    _invalidate_market_embeds(campaign_id for campaign_id, _, _ in markets)
+
+def get_campaigns_due_for_rotation(cutoff: str, limit: int = 5000):
+    """Returns IDs of existing campaigns whose market was generated before `cutoff` (ISO timestamp), oldest first."""
     conn = get_connection()
     c = conn.cursor()
     c.execute("""
-        INSERT INTO campaign_market (campaign_id, generated_at, trading_post, secret_stash)
-        VALUES (?, ?, ?, ?)
-        ON CONFLICT(campaign_id) DO UPDATE SET
-            generated_at=excluded.generated_at,
-            trading_post=excluded.trading_post,
-            secret_stash=excluded.secret_stash
-    """, (
-        campaign_id,
-        datetime.utcnow().isoformat(),
-        json.dumps(trading_post),
-        json.dumps(secret_stash)
-    ))
-    conn.commit()
+        SELECT m.campaign_id FROM campaign_market m
+        WHERE m.generated_at < ?
+          AND EXISTS (SELECT 1 FROM campaigns c WHERE c.id = m.campaign_id)
+        ORDER BY m.generated_at
+        LIMIT ?
+    """, (cutoff, limit))
+    campaign_ids = [row[0] for row in c.fetchall()]
+    conn.close()
+    return campaign_ids
+
+def get_market_generated_at(campaign_id):
+    """Returns when the campaign's market was generated, or None, without loading the items."""
+    conn = get_connection()
+    row = conn.execute("SELECT generated_at FROM campaign_market WHERE campaign_id = ?", (campaign_id,)).fetchone()
     conn.close()
+    return row[0] if row else None
 
 def get_market_data(campaign_id):
     conn = get_connection()
     c = conn.cursor()
-    c.execute("SELECT trading_post, secret_stash, generated_at FROM campaign_market WHERE campaign_id = ?", (campaign_id,))
+    c.execute("SELECT generated_at FROM campaign_market WHERE campaign_id = ?", (campaign_id,))
     row = c.fetchone()
+    if not row:
+        conn.close()
+        return None, None, None
+    c.execute("""
+        SELECT mi.section, mi.quantity, ci.id, ci.name, ci.category, ci.rarity, ci.rarity_rating, ci.cost
+        FROM campaign_market_items mi
+        JOIN catalog_items ci ON ci.id = mi.catalog_item_id
+        WHERE mi.campaign_id = ?
+        ORDER BY ci.category, ci.name
+    """, (campaign_id,))
+    sections = {section: [] for section in MARKET_SECTIONS}
+    for section, quantity, item_id, name, category, rarity, rarity_rating, cost in c.fetchall():
+        item = {"id": item_id, "Name": name, "Category": category, "Rarity": rarity, "Rarity Rating": rarity_rating, "Cost": cost}
+        sections[section].extend([item] * quantity)
     conn.close()
-    if row:
-        trading_post, secret_stash, generated_at = row
-        return json.loads(trading_post), json.loads(secret_stash), generated_at
-    return None, None, None
+    return sections["trading_post"], sections["secret_stash"], row[0]
+
+def _escape_like(text):
+    """Escapes LIKE wildcards so user input matches literally (with ESCAPE '\\')."""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def find_campaigns_stocking(server_id, query, limit=25):
+    """Returns up to `limit` (campaign_id, campaign_name, section, item_name) for markets in the server stocking items matching `query`."""
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("""
+        SELECT c.id, c.name, mi.section, ci.name
+        FROM catalog_items ci
+        JOIN campaign_market_items mi ON mi.catalog_item_id = ci.id
+        JOIN campaigns c ON c.id = mi.campaign_id
+        WHERE ci.name LIKE ? ESCAPE '\\' AND c.server_id = ?
+        ORDER BY c.name, ci.name
+        LIMIT ?
+    """, (f"%{_escape_like(query)}%", str(server_id), limit))
+    rows = c.fetchall()
+    conn.close()
+    return rows
 
 def create_trade_offer(campaign_id, from_gang_id, to_gang_id, offered_assets, offered_credits, requested_assets, requested_credits):
+    """Stores a pending offer and returns its ID. Raises ValueError if either credit amount is negative."""
+    if (offered_credits or 0) < 0 or (requested_credits or 0) < 0:
+        raise ValueError("Trade credits can't be negative")
     conn = get_connection()
     c = conn.cursor()
     c.execute("""
-        INSERT INTO trade_offers (campaign_id, from_gang_id, to_gang_id, offered_assets, offered_credits, requested_assets, requested_credits, status)
-        VALUES (?, ?, ?, ?, ?, ?, ?, 'pending')
-    """, (campaign_id, from_gang_id, to_gang_id, offered_assets, offered_credits, requested_assets, requested_credits))
+        INSERT INTO trade_offers (campaign_id, from_gang_id, to_gang_id, offered_assets, offered_credits, requested_assets, requested_credits, status, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, 'pending', ?)
+    """, (campaign_id, from_gang_id, to_gang_id, offered_assets, offered_credits, requested_assets, requested_credits, datetime.utcnow().isoformat()))
     offer_id = c.lastrowid
     conn.commit()
     conn.close()
@@ -57,38 +176,156 @@ def get_trade_offer(offer_id):
     return None
 
 
-def accept_trade_offer(offer_id):
-    offer = get_trade_offer(offer_id)
-    if not offer:
-        return False, "Trade offer not found."
-    if offer['status'] != 'pending':
-        return False, "Trade offer has already been resolved."
+def _resolve_trade_assets(spec, gang_assets):
+    """
+    Resolves a comma-separated list of asset IDs (or, for offers made before
+    assets were traded by ID, asset names) against one gang's assets.
+
+    Returns:
+        (asset_ids, missing) where `missing` lists the entries that gang doesn't own.
+    """
+    asset_ids = []
+    missing = []
+    by_name = {}
+    for asset_id, name in gang_assets.items():
+        by_name.setdefault(name.lower(), []).append(asset_id)
+    for token in (t.strip() for t in (spec or "").split(",")):
+        if not token:
+            continue
+        if token.isdigit() and int(token) in gang_assets and int(token) not in asset_ids:
+            asset_ids.append(int(token))
+            continue
+        candidates = [a for a in by_name.get(token.lower(), []) if a not in asset_ids]
+        if candidates:
+            asset_ids.append(candidates[0])
+        else:
+            missing.append(token)
+    return asset_ids, missing
+
+def accept_trade_offer(offer_id, to_gang_id, user_id=None):
+    """
+    Settles a pending trade offer addressed to `to_gang_id` in one
+    BEGIN IMMEDIATE transaction: the status check-and-set, the asset and
+    balance checks, the asset moves (one executemany) and the credits,
+    posted as paired ledger entries (one executemany). Concurrent accepts
+    serialize on the write lock, and only the first sees the offer as
+    pending. Nothing is settled if either gang lacks an asset or can't
+    cover the credits it pays.
 
+    Returns:
+        (accepted, message)
+    """
     conn = get_connection()
     c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        c.execute("""
+            UPDATE trade_offers SET status = 'accepted'
+            WHERE id = ? AND to_gang_id = ? AND status = 'pending'
+        """, (offer_id, to_gang_id))
+        if c.rowcount == 0:
+            c.execute("SELECT to_gang_id, status FROM trade_offers WHERE id = ?", (offer_id,))
+            row = c.fetchone()
+            conn.rollback()
+            if not row:
+                return False, "Trade offer not found."
+            if row[0] != to_gang_id:
+                return False, "This trade offer is not addressed to your gang."
+            return False, f"Trade offer has already been resolved ({row[1]})."
 
-    # Transfer assets
-    for asset_name in offer['offered_assets'].split(','):
-        c.execute("UPDATE gang_assets SET gang_id = ? WHERE gang_id = ? AND asset_type = ?", (offer['to_gang_id'], offer['from_gang_id'], asset_name.strip()))
-    for asset_name in offer['requested_assets'].split(','):
-        c.execute("UPDATE gang_assets SET gang_id = ? WHERE gang_id = ? AND asset_type = ?", (offer['from_gang_id'], offer['to_gang_id'], asset_name.strip()))
+        c.execute("""
+            SELECT from_gang_id, offered_assets, offered_credits, requested_assets, requested_credits
+            FROM trade_offers WHERE id = ?
+        """, (offer_id,))
+        from_gang_id, offered_assets, offered_credits, requested_assets, requested_credits = c.fetchone()
 
-    # Transfer credits
-    if offer['credits']:
-        c.execute("UPDATE gangs SET credits = credits - ? WHERE id = ?", (offer['credits'], offer['from_gang_id']))
-        c.execute("UPDATE gangs SET credits = credits + ? WHERE id = ?", (offer['credits'], offer['to_gang_id']))
+        c.execute("SELECT id, gang_id, name FROM gang_assets WHERE gang_id IN (?, ?)", (from_gang_id, to_gang_id))
+        owned = {from_gang_id: {}, to_gang_id: {}}
+        for asset_id, gang_id, name in c.fetchall():
+            owned[gang_id][asset_id] = name
+        offered_ids, offered_missing = _resolve_trade_assets(offered_assets, owned[from_gang_id])
+        requested_ids, requested_missing = _resolve_trade_assets(requested_assets, owned[to_gang_id])
+        if offered_missing or requested_missing:
+            conn.rollback()
+            problems = []
+            if offered_missing:
+                problems.append(f"gang {from_gang_id} no longer has {', '.join(offered_missing)}")
+            if requested_missing:
+                problems.append(f"gang {to_gang_id} no longer has {', '.join(requested_missing)}")
+            return False, f"Trade offer #{offer_id} can't be settled: {'; '.join(problems)}."
 
-    c.execute("UPDATE trade_offers SET status = 'accepted' WHERE id = ?", (offer_id,))
-    conn.commit()
-    conn.close()
-    return True, f"Trade offer #{offer_id} accepted."
+        # Offers stored before amounts were validated can carry negative
+        # credits, which would move money the other way unchecked.
+        if (offered_credits or 0) < 0 or (requested_credits or 0) < 0:
+            conn.rollback()
+            return False, f"Trade offer #{offer_id} can't be settled: it has a negative credit amount."
 
+        c.execute("SELECT gang_id, balance FROM gang_balances WHERE gang_id IN (?, ?)", (from_gang_id, to_gang_id))
+        balances = {from_gang_id: 0, to_gang_id: 0}
+        balances.update(c.fetchall())
+        short = [
+            f"gang {gang_id} only has {balances[gang_id]} of the {amount} credits it pays"
+            for gang_id, amount in ((from_gang_id, offered_credits or 0), (to_gang_id, requested_credits or 0))
+            if amount > balances[gang_id]
+        ]
+        if short:
+            conn.rollback()
+            return False, f"Trade offer #{offer_id} can't be settled: {'; '.join(short)}."
 
-def get_trade_offers_by_campaign(campaign_id):
+        c.executemany(
+            "UPDATE gang_assets SET gang_id = ? WHERE id = ? AND gang_id = ?",
+            [(to_gang_id, asset_id, from_gang_id) for asset_id in offered_ids]
+            + [(from_gang_id, asset_id, to_gang_id) for asset_id in requested_ids]
+        )
+
+        reason = f"Trade #{offer_id}"
+        ledger = []
+        if offered_credits:
+            ledger += [(from_gang_id, -offered_credits, reason, user_id), (to_gang_id, offered_credits, reason, user_id)]
+        if requested_credits:
+            ledger += [(to_gang_id, -requested_credits, reason, user_id), (from_gang_id, requested_credits, reason, user_id)]
+        c.executemany("INSERT INTO gang_transactions (gang_id, change, reason, user_id) VALUES (?, ?, ?, ?)", ledger)
+        conn.commit()
+    finally:
+        conn.close()
+
+    if offered_ids or requested_ids:
+        discard_asset_scopes(from_gang_id, to_gang_id)
+    return True, (
+        f"Trade offer #{offer_id} accepted: {len(offered_ids)} asset(s) and {offered_credits or 0} credits "
+        f"to gang {to_gang_id}, {len(requested_ids)} asset(s) and {requested_credits or 0} credits to gang {from_gang_id}."
+    )
+
+TRADE_OFFER_COLUMNS = ("id", "from_gang_id", "to_gang_id", "campaign_id", "offered_assets", "offered_credits", "requested_assets", "requested_credits", "status", "created_at")
+
+def get_trade_offers_by_campaign(campaign_id, status='pending', before_id=None, limit=10):
+    """
+    Returns one page of the campaign's offers with `status`, newest first,
+    keyset-paginated on id via the (campaign_id, status, id) index.
+
+    Returns:
+        (offers, next_before_id) where next_before_id is None on the last page.
+    """
     conn = get_connection()
     c = conn.cursor()
-    c.execute("SELECT * FROM trade_offers WHERE campaign_id = ?", (campaign_id,))
+    c.execute(f"""
+        SELECT {', '.join(TRADE_OFFER_COLUMNS)} FROM trade_offers
+        WHERE campaign_id = ? AND status = ? AND id < ?
+        ORDER BY id DESC
+        LIMIT ?
+    """, (campaign_id, status, before_id if before_id is not None else 2**63 - 1, limit + 1))
     rows = c.fetchall()
-    keys = [desc[0] for desc in c.description]
     conn.close()
-    return [dict(zip(keys, row)) for row in rows]
+    offers = [dict(zip(TRADE_OFFER_COLUMNS, row)) for row in rows[:limit]]
+    next_before_id = offers[-1]["id"] if len(rows) > limit else None
+    return offers, next_before_id
+
+def expire_trade_offers(cutoff: str) -> int:
+    """Marks every pending offer created before `cutoff` (ISO timestamp) as expired in one statement. Returns how many expired."""
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("UPDATE trade_offers SET status = 'expired' WHERE status = 'pending' AND created_at < ?", (cutoff,))
+    expired = c.rowcount
+    conn.commit()
+    conn.close()
+    return expired
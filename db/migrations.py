@@ -0,0 +1,376 @@
+"""
+Numbered schema migrations.
+
+Each step in MIGRATIONS runs in its own BEGIN IMMEDIATE transaction
+together with the schema_version bump, so a crash or error leaves the
+database at the last fully applied step and the next start resumes from
+there. Steps must only add to the schema or move data forward; append new
+steps to the end and never edit one that has shipped.
+"""
+import csv
+import json
+from collections import Counter
+from datetime import datetime
+
+def get_schema_version(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+    cursor = conn.execute("SELECT value FROM meta WHERE key = 'schema_version'")
+    row = cursor.fetchone()
+    return int(row[0]) if row else 0
+
+def set_schema_version(conn, version):
+    conn.execute("REPLACE INTO meta (key, value) VALUES ('schema_version', ?)", (str(version),))
+
+def _create_base_tables(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS campaigns (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        created_by TEXT NOT NULL,
+        server_id TEXT NOT NULL
+    )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS gangs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        campaign_id INTEGER NOT NULL,
+        yaktribe_url TEXT NOT NULL,
+        gang_name TEXT,
+        gang_type TEXT,
+        credits INTEGER,
+        meat INTEGER,
+        gang_rating INTEGER,
+        reputation INTEGER,
+        wealth INTEGER,
+        gangers TEXT,
+        FOREIGN KEY (campaign_id) REFERENCES campaigns (id)
+    )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS gang_transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        gang_id INTEGER NOT NULL,
+        change INTEGER NOT NULL,
+        reason TEXT,
+        user_id INTEGER,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (gang_id) REFERENCES gangs (id)
+    )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS gang_assets (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        gang_id INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        asset_type TEXT CHECK(asset_type IN ('Territory', 'Hanger-On', 'Skill', 'Equipment', 'Captive', 'Other')) NOT NULL,
+        static_value INTEGER,
+        roll_formula TEXT,
+        is_consumed BOOLEAN DEFAULT 0,
+        should_sell BOOLEAN DEFAULT 0,
+        note TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (gang_id) REFERENCES gangs (id)
+    )''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS campaign_market (
+            campaign_id INTEGER PRIMARY KEY,
+            generated_at TEXT NOT NULL,
+            trading_post TEXT NOT NULL,
+            secret_stash TEXT NOT NULL,
+            FOREIGN KEY (campaign_id) REFERENCES campaigns(id)
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_campaign_market_generated_at ON campaign_market (generated_at)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS trade_offers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            from_gang_id INTEGER NOT NULL,
+            to_gang_id INTEGER NOT NULL,
+            campaign_id INTEGER NOT NULL,
+            offered_assets TEXT,
+            offered_credits INTEGER DEFAULT 0,
+            requested_assets TEXT,
+            requested_credits INTEGER DEFAULT 0,
+            status TEXT DEFAULT 'pending',
+            FOREIGN KEY (from_gang_id) REFERENCES gangs(id),
+            FOREIGN KEY (to_gang_id) REFERENCES gangs(id),
+            FOREIGN KEY (campaign_id) REFERENCES campaigns(id)
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_trade_offers_campaign_id ON trade_offers (campaign_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_trade_offers_to_gang_id ON trade_offers (to_gang_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_trade_offers_from_gang_id ON trade_offers (from_gang_id)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_preferences (
+            user_id TEXT PRIMARY KEY,
+            current_campaign_id INTEGER,
+            current_gang_id INTEGER,
+            FOREIGN KEY (current_campaign_id) REFERENCES campaigns(id),
+            FOREIGN KEY (current_gang_id) REFERENCES gangs(id)
+        )
+    ''')
+
+def _add_gang_balances(conn):
+    # Materialized per-gang balance, kept in step with the ledger by a trigger
+    # so every insert into gang_transactions updates it in the same transaction.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS gang_balances (
+            gang_id INTEGER PRIMARY KEY,
+            balance INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (gang_id) REFERENCES gangs (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_gang_transactions_balance
+        AFTER INSERT ON gang_transactions
+        BEGIN
+            INSERT INTO gang_balances (gang_id, balance) VALUES (NEW.gang_id, NEW.change)
+            ON CONFLICT(gang_id) DO UPDATE SET balance = balance + excluded.balance;
+        END
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_gang_transactions_gang_id_timestamp ON gang_transactions (gang_id, timestamp)')
+    conn.execute('''
+        INSERT OR REPLACE INTO gang_balances (gang_id, balance)
+        SELECT gang_id, SUM(change) FROM gang_transactions GROUP BY gang_id
+    ''')
+
+def _add_transaction_counts(conn):
+    # Cached ledger length for history pagination, maintained by the same trigger.
+    conn.execute('ALTER TABLE gang_balances ADD COLUMN transaction_count INTEGER NOT NULL DEFAULT 0')
+    conn.execute('DROP TRIGGER IF EXISTS trg_gang_transactions_balance')
+    conn.execute('''
+        CREATE TRIGGER trg_gang_transactions_balance
+        AFTER INSERT ON gang_transactions
+        BEGIN
+            INSERT INTO gang_balances (gang_id, balance, transaction_count) VALUES (NEW.gang_id, NEW.change, 1)
+            ON CONFLICT(gang_id) DO UPDATE SET
+                balance = balance + excluded.balance,
+                transaction_count = transaction_count + 1;
+        END
+    ''')
+    conn.execute('''
+        UPDATE gang_balances SET transaction_count = (
+            SELECT COUNT(*) FROM gang_transactions t WHERE t.gang_id = gang_balances.gang_id
+        )
+    ''')
+
+def _add_yaktribe_pages(conn):
+    # Last fetched copy of each Yaktribe page, zlib-compressed, with the
+    # validators needed for conditional GETs.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS yaktribe_pages (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            fetched_at TEXT NOT NULL,
+            body BLOB NOT NULL
+        )
+    ''')
+
+def _add_payday_jobs(conn):
+    # Campaign paydays run as resumable background jobs. The idempotency
+    # key (campaign + payday cycle) stops a cycle from being paid twice,
+    # and each gang is checkpointed in the same transaction as its
+    # ledger entry.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS payday_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            campaign_id INTEGER NOT NULL,
+            cycle TEXT NOT NULL,
+            idempotency_key TEXT NOT NULL UNIQUE,
+            status TEXT NOT NULL DEFAULT 'pending',
+            requested_by INTEGER,
+            channel_id INTEGER,
+            message_id INTEGER,
+            total_gangs INTEGER NOT NULL DEFAULT 0,
+            completed_gangs INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            FOREIGN KEY (campaign_id) REFERENCES campaigns (id)
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_payday_jobs_status ON payday_jobs (status)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS payday_job_gangs (
+            job_id INTEGER NOT NULL,
+            gang_id INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            total INTEGER,
+            summary TEXT,
+            PRIMARY KEY (job_id, gang_id),
+            FOREIGN KEY (job_id) REFERENCES payday_jobs (id)
+        )
+    ''')
+
+_UPSERT_CATALOG_ITEM_V6 = """
+    INSERT INTO catalog_items (id, name, category, rarity, rarity_rating, cost)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        name=excluded.name,
+        category=excluded.category,
+        rarity=excluded.rarity,
+        rarity_rating=excluded.rarity_rating,
+        cost=excluded.cost
+"""
+
+def _read_trading_post_v6(path):
+    """
+    Returns the Trading Post CSV rows as (id, name, category, rarity,
+    rarity_rating, cost) tuples, skipping rows the catalog loader of
+    version 6 skipped: a missing required field or an unreadable rarity.
+    """
+    rows = []
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for record in csv.DictReader(f):
+            values = {key: (record.get(key) or "").strip() for key in ("Name", "Category", "Rarity", "Rarity Rating", "Cost")}
+            if not all(values.values()):
+                continue
+            rating = values["Rarity Rating"].upper()
+            if rating != "C" and not (rating[:1] in ("R", "I") and _is_int(rating[1:])):
+                continue
+            item_id = int(record["#"]) if (record.get("#") or "").strip().isdigit() else len(rows) + 1
+            rows.append((item_id, values["Name"], values["Category"], values["Rarity"], values["Rarity Rating"], values["Cost"]))
+    return rows
+
+def _is_int(value):
+    try:
+        int(value)
+    except ValueError:
+        return False
+    return True
+
+def _normalize_markets(conn):
+    # Markets reference catalog rows instead of carrying JSON copies of
+    # every item.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS catalog_items (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            category TEXT NOT NULL,
+            rarity TEXT,
+            rarity_rating TEXT,
+            cost TEXT
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_catalog_items_name ON catalog_items (name COLLATE NOCASE)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS campaign_market_items (
+            campaign_id INTEGER NOT NULL,
+            section TEXT NOT NULL CHECK(section IN ('trading_post', 'secret_stash')),
+            catalog_item_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL DEFAULT 1,
+            PRIMARY KEY (campaign_id, section, catalog_item_id),
+            FOREIGN KEY (campaign_id) REFERENCES campaigns (id),
+            FOREIGN KEY (catalog_item_id) REFERENCES catalog_items (id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_campaign_market_items_catalog_item ON campaign_market_items (catalog_item_id)')
+
+    # The CSV reading and blob transform below are frozen copies of how
+    # services.catalog and db.marketplace worked when this step shipped, so
+    # later changes there can't change what this step does.
+    try:
+        catalog = _read_trading_post_v6("./Trading Post.csv")
+    except OSError as e:
+        print(f"Warning: could not seed catalog_items from the Trading Post CSV: {e}")
+        catalog = []
+    conn.executemany(_UPSERT_CATALOG_ITEM_V6, catalog)
+
+    # Match blob items to catalog rows by name. Items that are no longer in
+    # the catalog are kept under negative ids so no CSV row can ever claim them.
+    item_ids = {name.lower(): item_id for item_id, name in conn.execute("SELECT id, name FROM catalog_items")}
+    orphans = []
+    counts = Counter()
+    for campaign_id, trading_post, secret_stash in conn.execute("SELECT campaign_id, trading_post, secret_stash FROM campaign_market").fetchall():
+        for section, blob in (("trading_post", trading_post), ("secret_stash", secret_stash)):
+            for item in json.loads(blob or "[]"):
+                name = item.get("Name") or "Unknown Item"
+                item_id = item_ids.get(name.lower())
+                if item_id is None:
+                    item_id = item_ids[name.lower()] = -(len(orphans) + 1)
+                    orphans.append((
+                        item_id, name, item.get("Category") or "Uncategorized",
+                        item.get("Rarity"), item.get("Rarity Rating"), item.get("Cost")
+                    ))
+                counts[(campaign_id, section, item_id)] += 1
+
+    if orphans:
+        print(f"Warning: {len(orphans)} market items are no longer in the Trading Post; kept them as retired catalog entries.")
+    conn.executemany(_UPSERT_CATALOG_ITEM_V6, orphans)
+    conn.executemany(
+        "INSERT OR REPLACE INTO campaign_market_items (campaign_id, section, catalog_item_id, quantity) VALUES (?, ?, ?, ?)",
+        [(campaign_id, section, item_id, quantity) for (campaign_id, section, item_id), quantity in counts.items()]
+    )
+
+    # Rebuild campaign_market without the blob columns.
+    conn.execute('''
+        CREATE TABLE campaign_market_new (
+            campaign_id INTEGER PRIMARY KEY,
+            generated_at TEXT NOT NULL,
+            FOREIGN KEY (campaign_id) REFERENCES campaigns(id)
+        )
+    ''')
+    conn.execute("INSERT INTO campaign_market_new (campaign_id, generated_at) SELECT campaign_id, generated_at FROM campaign_market")
+    conn.execute("DROP TABLE campaign_market")
+    conn.execute("ALTER TABLE campaign_market_new RENAME TO campaign_market")
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_campaign_market_generated_at ON campaign_market (generated_at)')
+
+def _index_trade_offers(conn):
+    # Trade listings page by (campaign_id, status, id); the sweeper expires
+    # stale pending offers by (status, created_at). Offers that predate
+    # created_at get the migration time, so they expire a full TTL later.
+    conn.execute('ALTER TABLE trade_offers ADD COLUMN created_at TEXT')
+    conn.execute("UPDATE trade_offers SET created_at = ? WHERE created_at IS NULL", (datetime.utcnow().isoformat(),))
+    conn.execute('DROP INDEX IF EXISTS idx_trade_offers_campaign_id')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_trade_offers_campaign_status_id ON trade_offers (campaign_id, status, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_trade_offers_status_created_at ON trade_offers (status, created_at)')
+
+def _index_hot_filters(conn):
+    # Indexes for the lookups every command makes: a gang's assets, a
+    # campaign's gangs, a user's gangs and a server's campaigns. The ledger's
+    # (gang_id, timestamp) index has existed since version 2.
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_gang_assets_gang_id ON gang_assets (gang_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_gangs_campaign_id ON gangs (campaign_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_gangs_user_id ON gangs (user_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_campaigns_server_id ON campaigns (server_id)')
+
+MIGRATIONS = (
+    (1, _create_base_tables),
+    (2, _add_gang_balances),
+    (3, _add_transaction_counts),
+    (4, _add_yaktribe_pages),
+    (5, _add_payday_jobs),
+    (6, _normalize_markets),
+    (7, _index_trade_offers),
+    (8, _index_hot_filters),
+)
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def run_migrations(conn) -> list[int]:
+    """
+    Applies every migration newer than the database's schema version, in
+    order, and returns the versions applied. The version is re-read inside
+    each step's write lock, so two processes starting at once don't apply a
+    step twice. Runs ANALYZE afterwards if anything changed, so the query
+    planner has statistics for the new indexes.
+    """
+    applied = []
+    for version, migrate in MIGRATIONS:
+        if get_schema_version(conn) >= version:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            migrate(conn)
+            set_schema_version(conn, version)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+        print(f"Applied schema migration {version} ({migrate.__name__.lstrip('_')})")
+
+    current = get_schema_version(conn)
+    if current > LATEST_VERSION:
+        print(f"Warning: database schema version {current} is newer than this code ({LATEST_VERSION})")
+    if applied:
+        conn.execute("ANALYZE")
+        conn.commit()
+    return applied
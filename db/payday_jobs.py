@@ -0,0 +1,172 @@
+import json
+from datetime import datetime
+from typing import NamedTuple, Optional
+from db import get_connection
+
+UNFINISHED_STATUSES = ('pending', 'running')
+
+class PaydayJob(NamedTuple):
+    id: int
+    campaign_id: int
+    cycle: str
+    status: str
+    requested_by: Optional[int]
+    channel_id: Optional[int]
+    message_id: Optional[int]
+    total_gangs: int
+    completed_gangs: int
+    error: Optional[str]
+
+JOB_COLUMNS = "id, campaign_id, cycle, status, requested_by, channel_id, message_id, total_gangs, completed_gangs, error"
+
+def payday_idempotency_key(campaign_id: int, cycle: str) -> str:
+    return f"{campaign_id}:{cycle}"
+
+def create_payday_job(campaign_id: int, cycle: str, requested_by: int, channel_id: Optional[int] = None, message_id: Optional[int] = None):
+    """
+    Creates the payday job for this campaign and cycle, snapshotting the
+    campaign's gangs as pending. If a job already exists for the same
+    idempotency key, nothing is written and that job is returned instead.
+
+    Returns:
+        (PaydayJob, created), or (None, False) if the campaign has no gangs.
+    """
+    key = payday_idempotency_key(campaign_id, cycle)
+    now = datetime.utcnow().isoformat()
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        c.execute(f"SELECT {JOB_COLUMNS} FROM payday_jobs WHERE idempotency_key = ?", (key,))
+        row = c.fetchone()
+        if row:
+            conn.rollback()
+            return PaydayJob(*row), False
+
+        c.execute("""
+            INSERT INTO payday_jobs (campaign_id, cycle, idempotency_key, requested_by, channel_id, message_id, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (campaign_id, cycle, key, requested_by, channel_id, message_id, now, now))
+        job_id = c.lastrowid
+        c.execute("""
+            INSERT INTO payday_job_gangs (job_id, gang_id)
+            SELECT ?, id FROM gangs WHERE campaign_id = ?
+        """, (job_id, campaign_id))
+        if c.rowcount == 0:
+            # Nothing to pay; don't use up the cycle's idempotency key.
+            conn.rollback()
+            return None, False
+        c.execute("UPDATE payday_jobs SET total_gangs = ? WHERE id = ?", (c.rowcount, job_id))
+        c.execute(f"SELECT {JOB_COLUMNS} FROM payday_jobs WHERE id = ?", (job_id,))
+        job = PaydayJob(*c.fetchone())
+        conn.commit()
+        return job, True
+    finally:
+        conn.close()
+
+def get_payday_job(job_id: int) -> Optional[PaydayJob]:
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute(f"SELECT {JOB_COLUMNS} FROM payday_jobs WHERE id = ?", (job_id,))
+    row = c.fetchone()
+    conn.close()
+    return PaydayJob(*row) if row else None
+
+def get_unfinished_payday_jobs() -> list[int]:
+    """IDs of jobs that were queued or interrupted, oldest first."""
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute(f"SELECT id FROM payday_jobs WHERE status IN ({', '.join('?' * len(UNFINISHED_STATUSES))}) ORDER BY id", UNFINISHED_STATUSES)
+    job_ids = [row[0] for row in c.fetchall()]
+    conn.close()
+    return job_ids
+
+def get_pending_job_gangs(job_id: int) -> list[int]:
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("SELECT gang_id FROM payday_job_gangs WHERE job_id = ? AND status = 'pending'", (job_id,))
+    gang_ids = [row[0] for row in c.fetchall()]
+    conn.close()
+    return gang_ids
+
+def complete_job_gangs(job_id: int, results: list[tuple[int, int, list]], user_id: int, reason: str = "Pay Day"):
+    """
+    Checkpoints a batch of gangs: writes their ledger rows and marks them done
+    in one transaction. Gangs that are no longer pending (already paid by an
+    earlier attempt) are skipped, so a batch can safely be retried.
+
+    Args:
+        results: List of (gang_id, total, summary) for gangs to pay.
+
+    Returns:
+        The IDs of the gangs this call paid.
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        c.execute("SELECT gang_id FROM payday_job_gangs WHERE job_id = ? AND status = 'pending'", (job_id,))
+        pending = {row[0] for row in c.fetchall()}
+        results = [r for r in results if r[0] in pending]
+        c.executemany(
+            "INSERT INTO gang_transactions (gang_id, change, reason, user_id) VALUES (?, ?, ?, ?)",
+            [(gang_id, total, reason, user_id) for gang_id, total, _ in results]
+        )
+        c.executemany(
+            "UPDATE payday_job_gangs SET status = 'done', total = ?, summary = ? WHERE job_id = ? AND gang_id = ? AND status = 'pending'",
+            [(total, json.dumps(summary), job_id, gang_id) for gang_id, total, summary in results]
+        )
+        c.execute("""
+            UPDATE payday_jobs SET status = 'running', completed_gangs = completed_gangs + ?, updated_at = ?
+            WHERE id = ?
+        """, (c.rowcount, datetime.utcnow().isoformat(), job_id))
+        conn.commit()
+        return [gang_id for gang_id, _, _ in results]
+    finally:
+        conn.close()
+
+def skip_job_gangs(job_id: int, gang_ids: list[int]):
+    """Marks gangs that disappeared from the campaign since the job was created."""
+    conn = get_connection()
+    with conn:
+        # Only gangs still pending are counted, so progress can't pass total_gangs.
+        skipped = conn.executemany(
+            "UPDATE payday_job_gangs SET status = 'skipped' WHERE job_id = ? AND gang_id = ? AND status = 'pending'",
+            [(job_id, gang_id) for gang_id in gang_ids]
+        ).rowcount
+        conn.execute("UPDATE payday_jobs SET completed_gangs = completed_gangs + ? WHERE id = ?", (skipped, job_id))
+    conn.close()
+
+def set_payday_job_message(job_id: int, channel_id: Optional[int], message_id: Optional[int]):
+    """Points the job's progress reports at a new message, e.g. the one that asked to resume it."""
+    conn = get_connection()
+    conn.execute(
+        "UPDATE payday_jobs SET channel_id = ?, message_id = ?, updated_at = ? WHERE id = ?",
+        (channel_id, message_id, datetime.utcnow().isoformat(), job_id)
+    )
+    conn.commit()
+    conn.close()
+
+def finish_payday_job(job_id: int, status: str, error: Optional[str] = None):
+    conn = get_connection()
+    conn.execute(
+        "UPDATE payday_jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+        (status, error, datetime.utcnow().isoformat(), job_id)
+    )
+    conn.commit()
+    conn.close()
+
+def get_payday_job_results(job_id: int) -> list[tuple[int, str, int, list]]:
+    """Returns (gang_id, gang_name, total, summary) for every gang the job paid."""
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("""
+        SELECT jg.gang_id, g.gang_name, jg.total, jg.summary
+        FROM payday_job_gangs jg
+        JOIN gangs g ON g.id = jg.gang_id
+        WHERE jg.job_id = ? AND jg.status = 'done'
+        ORDER BY jg.gang_id
+    """, (job_id,))
+    rows = [(gang_id, name, total, json.loads(summary)) for gang_id, name, total, summary in c.fetchall()]
+    conn.close()
+    return rows
@@ -0,0 +1,154 @@
+import queue
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+import weakref
+
+# Applied to every new connection. WAL lets readers run alongside the single
+# writer, and NORMAL sync is safe under WAL (only the last commits can be lost
+# on power failure, never corrupted).
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",    # ~16 MB page cache per connection
+    "PRAGMA mmap_size = 268435456",  # 256 MB memory-mapped I/O
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA temp_store = MEMORY",
+)
+
+class PoolTimeoutError(sqlite3.OperationalError):
+    pass
+
+class PooledConnection:
+    """
+    Thin proxy around a pooled sqlite3 connection. Everything is delegated to
+    the real connection except `close()`, which hands it back to the pool, so
+    existing `conn = get_connection() ... conn.close()` code keeps working.
+    """
+    def __init__(self, pool, conn, checked_out_from, stack):
+        self._pool = pool
+        self._conn = conn
+        self.checked_out_at = time.monotonic()
+        self.checked_out_from = checked_out_from
+        self.stack = stack
+
+    def __getattr__(self, name):
+        conn = self.__dict__.get("_conn")
+        if conn is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        return getattr(conn, name)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._conn.__exit__(exc_type, exc, tb)
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool._release(self, conn)
+
+    def __del__(self):
+        conn = self.__dict__.get("_conn")
+        if conn is not None:
+            print(f"Warning: database connection checked out from {self.checked_out_from} was never closed")
+            self.close()
+
+class ConnectionPool:
+    """
+    A bounded pool of pre-configured SQLite connections.
+
+    Connections are created lazily up to `max_size`; callers block for up to
+    `timeout` seconds when all of them are checked out. Each connection keeps
+    its own prepared statement cache (`cached_statements`), which now survives
+    between queries instead of being thrown away with the connection.
+
+    Checked-out connections are tracked so leaks can be reported with the
+    call site that acquired them (and the full stack when `track_stacks` is on).
+    """
+    def __init__(self, path, max_size=8, timeout=10.0, cached_statements=256, track_stacks=False):
+        self.path = path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self.track_stacks = track_stacks
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.RLock()
+        self._checked_out = weakref.WeakValueDictionary()
+        self._created = 0
+        self._waits = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=self.cached_statements)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        with self._lock:
+            self._created += 1
+        return conn
+
+    def acquire(self):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._waits += 1
+            if not self._slots.acquire(timeout=self.timeout):
+                raise PoolTimeoutError(f"Timed out after {self.timeout}s waiting for a database connection")
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+        caller = sys._getframe(2)
+        checked_out_from = f"{caller.f_code.co_filename}:{caller.f_lineno} ({caller.f_code.co_name})"
+        stack = traceback.format_stack(limit=12)[:-2] if self.track_stacks else None
+        proxy = PooledConnection(self, conn, checked_out_from, stack)
+        with self._lock:
+            self._checked_out[id(proxy)] = proxy
+        return proxy
+
+    def _release(self, proxy, conn):
+        with self._lock:
+            self._checked_out.pop(id(proxy), None)
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+        except sqlite3.Error:
+            conn.close()
+        finally:
+            self._slots.release()
+
+    def leaks(self, older_than=30.0):
+        """Returns (call site, seconds held, stack) for connections held longer than `older_than` seconds."""
+        now = time.monotonic()
+        with self._lock:
+            held = list(self._checked_out.values())
+        return [
+            (p.checked_out_from, now - p.checked_out_at, p.stack)
+            for p in held
+            if now - p.checked_out_at >= older_than
+        ]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "created": self._created,
+                "in_use": len(self._checked_out),
+                "idle": self._idle.qsize(),
+                "waits": self._waits,
+            }
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
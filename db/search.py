@@ -0,0 +1,145 @@
+import bisect
+import threading
+from collections import OrderedDict, defaultdict
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class SearchIndex:
+    """
+    In-memory name index for one scope (a guild's campaigns, a campaign's
+    gangs, a gang's assets).
+
+    Names are kept lower-cased in a sorted array for prefix lookups via
+    bisect, plus a trigram map for substring lookups. Results are ranked
+    exact match first, then prefix matches, then word-start matches, then any
+    other substring match, alphabetically within each group.
+    """
+    def __init__(self, entries=()):
+        self._entries = {}
+        self._sorted = []
+        self._trigrams = defaultdict(set)
+        for entry_id, name, extra in entries:
+            self.add(entry_id, name, extra)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, entry_id, name, extra=None):
+        if entry_id in self._entries:
+            self.remove(entry_id)
+        name = name or ""
+        lowered = name.lower()
+        self._entries[entry_id] = (name, lowered, extra)
+        bisect.insort(self._sorted, (lowered, entry_id))
+        for gram in _trigrams(lowered):
+            self._trigrams[gram].add(entry_id)
+
+    def remove(self, entry_id):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        _, lowered, _ = entry
+        i = bisect.bisect_left(self._sorted, (lowered, entry_id))
+        if i < len(self._sorted) and self._sorted[i] == (lowered, entry_id):
+            del self._sorted[i]
+        for gram in _trigrams(lowered):
+            ids = self._trigrams.get(gram)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._trigrams[gram]
+
+    def _substring_candidates(self, query):
+        if len(query) < 3:
+            return [entry_id for _, entry_id in self._sorted]
+        grams = sorted((self._trigrams.get(g, set()) for g in _trigrams(query)), key=len)
+        candidates = set(grams[0]).intersection(*grams[1:])
+        return [entry_id for _, entry_id in sorted((self._entries[i][1], i) for i in candidates)]
+
+    def search(self, query, limit=25, predicate=None):
+        """Returns up to `limit` (entry_id, name, extra) tuples, best matches first."""
+        query = (query or "").lower()
+        results = []
+        seen = set()
+
+        def take(entry_id):
+            name, _, extra = self._entries[entry_id]
+            if entry_id in seen or (predicate and not predicate(extra)):
+                return False
+            seen.add(entry_id)
+            results.append((entry_id, name, extra))
+            return len(results) >= limit
+
+        # Exact and prefix matches sit together in the sorted array.
+        prefix_ids = []
+        for i in range(bisect.bisect_left(self._sorted, (query,)), len(self._sorted)):
+            lowered, entry_id = self._sorted[i]
+            if not lowered.startswith(query) or (len(prefix_ids) >= limit and lowered != query):
+                break
+            prefix_ids.append((lowered != query, entry_id))
+        for _, entry_id in sorted(prefix_ids, key=lambda p: p[0]):
+            if take(entry_id):
+                return results
+
+        word_matches = []
+        other_matches = []
+        for entry_id in self._substring_candidates(query):
+            if entry_id in seen:
+                continue
+            lowered = self._entries[entry_id][1]
+            position = lowered.find(query)
+            if position <= 0:
+                continue
+            if not lowered[position - 1].isalnum():
+                word_matches.append(entry_id)
+            else:
+                other_matches.append(entry_id)
+        for entry_id in word_matches + other_matches:
+            if take(entry_id):
+                break
+        return results
+
+class SearchIndexes:
+    """
+    Lazily built SearchIndex per scope key, kept current by the db write
+    functions. A scope is loaded from the database the first time it is
+    searched; writes to scopes that aren't loaded are ignored, since the next
+    load will see them anyway. The least recently used scopes are dropped
+    once `max_scopes` is exceeded.
+    """
+    def __init__(self, loader, max_scopes=1024):
+        self._loader = loader
+        self._max_scopes = max_scopes
+        self._scopes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def search(self, scope, query, limit=25, predicate=None):
+        scope = str(scope)
+        with self._lock:
+            index = self._scopes.get(scope)
+            if index is None:
+                # Loaded under the lock so no concurrent write can slip in
+                # between reading the rows and publishing the index.
+                index = self._scopes[scope] = SearchIndex(self._loader(scope))
+                while len(self._scopes) > self._max_scopes:
+                    self._scopes.popitem(last=False)
+            else:
+                self._scopes.move_to_end(scope)
+            return index.search(query, limit, predicate)
+
+    def add(self, scope, entry_id, name, extra=None):
+        with self._lock:
+            index = self._scopes.get(str(scope))
+            if index is not None:
+                index.add(entry_id, name, extra)
+
+    def remove(self, scope, entry_id):
+        with self._lock:
+            index = self._scopes.get(str(scope))
+            if index is not None:
+                index.remove(entry_id)
+
+    def discard_scope(self, scope):
+        with self._lock:
+            self._scopes.pop(str(scope), None)
@@ -1,4 +1,7 @@
 from db import get_connection
+from db.cache import LRUCache, MISSING
+
+_preferences_cache = LRUCache("user_preferences", maxsize=4096, ttl=600.0)
 
 def set_user_preferences(user_id, campaign_id=None, gang_id=None):
     conn = get_connection()
@@ -25,12 +28,21 @@ def set_user_preferences(user_id, campaign_id=None, gang_id=None):
                 ON CONFLICT(user_id) DO UPDATE SET
                     current_gang_id=excluded.current_gang_id
             ''', (user_id, gang_id))
+    conn.close()
+    _preferences_cache.invalidate(user_id)
 
 def get_user_preferences(user_id):
+    prefs = _preferences_cache.get(user_id)
+    if prefs is not MISSING:
+        return prefs
+
     conn = get_connection()
     cur = conn.cursor()
     cur.execute('''
         SELECT current_campaign_id, current_gang_id
         FROM user_preferences WHERE user_id = ?
     ''', (user_id,))
-    return cur.fetchone()
\ No newline at end of file
+    row = cur.fetchone()
+    conn.close()
+    _preferences_cache.set(user_id, row)
+    return row
\ No newline at end of file
@@ -0,0 +1,166 @@
+import queue
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from db import get_connection
+
+# How long the writer waits after the first queued write for others to join its batch.
+WRITE_WINDOW = 0.002
+MAX_BATCH = 500
+BUSY_RETRIES = 5
+BUSY_BACKOFF = 0.05
+
+_STOP = object()
+
+def is_busy_error(e):
+    return isinstance(e, sqlite3.OperationalError) and ("locked" in str(e) or "busy" in str(e))
+
+class WriteQueue:
+    """
+    Group commit for small, frequent writes.
+
+    Callers submit `op(conn, *args)` and get a Future. A single writer
+    thread takes whatever arrives within `window` seconds of the first
+    queued write (up to `max_batch`) and runs the batch in one BEGIN
+    IMMEDIATE transaction, each op inside its own savepoint so one failing
+    op doesn't sink the others. Futures are resolved only after the commit,
+    so a caller never sees a write that could still be rolled back. If the
+    database is busy, the whole batch is retried with jittered exponential
+    backoff. Ops may run more than once and must not commit themselves.
+    """
+    def __init__(self, window=WRITE_WINDOW, max_batch=MAX_BATCH, retries=BUSY_RETRIES):
+        self.window = window
+        self.max_batch = max_batch
+        self.retries = retries
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+        self.batches = 0
+        self.writes = 0
+        self.busy_retries = 0
+
+    def submit(self, op, *args, **kwargs) -> Future:
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Write queue is closed")
+            self._queue.put((op, args, kwargs, future))
+        return future
+
+    def write(self, op, *args, **kwargs):
+        """Submits `op` and waits for its batch to commit, returning the op's result."""
+        return self.submit(op, *args, **kwargs).result()
+
+    def close(self):
+        """Stops accepting writes, commits everything already queued, and stops the writer thread."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join()
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "writes": self.writes,
+            "busy_retries": self.busy_retries,
+            "queued": self._queue.qsize(),
+        }
+
+    def _next_batch(self):
+        first = self._queue.get()
+        if first is _STOP:
+            return None, True
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._next_batch()
+            if batch:
+                self._commit(batch)
+
+    def _commit(self, batch):
+        batch = [item for item in batch if item[3].set_running_or_notify_cancel()]
+        for attempt in range(self.retries + 1):
+            try:
+                outcomes = self._execute(batch)
+            except Exception as e:
+                if is_busy_error(e) and attempt < self.retries:
+                    self.busy_retries += 1
+                    time.sleep(BUSY_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5))
+                    continue
+                for _, _, _, future in batch:
+                    future.set_exception(e)
+                return
+            self.batches += 1
+            self.writes += len(batch)
+            for (_, _, _, future), (ok, value) in zip(batch, outcomes):
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+            return
+
+    def _execute(self, batch):
+        conn = get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            outcomes = []
+            for op, args, kwargs, _ in batch:
+                conn.execute("SAVEPOINT write_op")
+                try:
+                    outcomes.append((True, op(conn, *args, **kwargs)))
+                    conn.execute("RELEASE write_op")
+                except Exception as e:
+                    if is_busy_error(e):
+                        raise
+                    conn.execute("ROLLBACK TO write_op")
+                    conn.execute("RELEASE write_op")
+                    outcomes.append((False, e))
+            conn.commit()
+            return outcomes
+        finally:
+            # Rolls back anything left open by a failed attempt.
+            conn.close()
+
+_write_queue = None
+_write_queue_lock = threading.Lock()
+
+def get_write_queue() -> WriteQueue:
+    global _write_queue
+    with _write_queue_lock:
+        if _write_queue is None:
+            _write_queue = WriteQueue()
+        return _write_queue
+
+def submit_write(op, *args, **kwargs) -> Future:
+    return get_write_queue().submit(op, *args, **kwargs)
+
+def after_commit(future: Future, callback):
+    """Calls `callback(result)` once the write has committed; does nothing if it failed."""
+    future.add_done_callback(lambda f: f.cancelled() or f.exception() is not None or callback(f.result()))
+
+def close_write_queue():
+    global _write_queue
+    with _write_queue_lock:
+        write_queue, _write_queue = _write_queue, None
+    if write_queue is not None:
+        write_queue.close()
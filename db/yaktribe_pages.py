@@ -0,0 +1,43 @@
+import zlib
+from datetime import datetime
+from typing import NamedTuple, Optional
+from db import get_connection
+
+class CachedPage(NamedTuple):
+    html: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: str
+
+def save_page(url: str, html: str, etag: Optional[str] = None, last_modified: Optional[str] = None):
+    """Stores the raw page zlib-compressed, replacing any previous copy."""
+    conn = get_connection()
+    conn.execute("""
+        INSERT INTO yaktribe_pages (url, etag, last_modified, fetched_at, body)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(url) DO UPDATE SET
+            etag=excluded.etag,
+            last_modified=excluded.last_modified,
+            fetched_at=excluded.fetched_at,
+            body=excluded.body
+    """, (url, etag, last_modified, datetime.utcnow().isoformat(), zlib.compress(html.encode("utf-8"), 6)))
+    conn.commit()
+    conn.close()
+
+def touch_page(url: str):
+    """Records that a conditional GET confirmed the stored copy is still current."""
+    conn = get_connection()
+    conn.execute("UPDATE yaktribe_pages SET fetched_at = ? WHERE url = ?", (datetime.utcnow().isoformat(), url))
+    conn.commit()
+    conn.close()
+
+def get_cached_page(url: str) -> Optional[CachedPage]:
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("SELECT body, etag, last_modified, fetched_at FROM yaktribe_pages WHERE url = ?", (url,))
+    row = c.fetchone()
+    conn.close()
+    if not row:
+        return None
+    body, etag, last_modified, fetched_at = row
+    return CachedPage(zlib.decompress(body).decode("utf-8"), etag, last_modified, fetched_at)
@@ -2,7 +2,8 @@ import discord
 from discord.ext import commands
 import os
 from dotenv import load_dotenv
-from db.__init__ import init_db
+from db import init_db, shutdown_executor, close_pool
+from db.writer import close_write_queue
 from cogs.admin import Admin, admin_group
 from cogs.dice import Dice, dice_group
 from cogs.campaigns import Campaigns, campaign_group
@@ -11,12 +12,18 @@ from cogs.banking import Banking, banking_group
 from cogs.assets import Assets, asset_group
 from cogs.marketplace import Marketplace, marketplace_group
 from cogs.user_preferences import UserPreferences, profile_group
+from services import yaktribe
 
 intents = discord.Intents.default()
 intents.messages = True
 intents.message_content = True
 
-bot = commands.Bot(command_prefix='!', intents=intents)
+class NecromundaBot(commands.Bot):
+    async def close(self):
+        await yaktribe.close()
+        await super().close()
+
+bot = NecromundaBot(command_prefix='!', intents=intents)
 
 @bot.event
 async def on_ready():
@@ -51,4 +58,7 @@ if __name__ == '__main__':
     load_dotenv()
     init_db()
     bot.owner_id = int(os.getenv("BOT_OWNER_ID"))
-    bot.run(os.getenv('DISCORD_BOT_TOKEN'))
\ No newline at end of file
+    bot.run(os.getenv('DISCORD_BOT_TOKEN'))
+    shutdown_executor()
+    close_write_queue()
+    close_pool()
\ No newline at end of file
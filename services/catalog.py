@@ -0,0 +1,144 @@
+import csv
+import os
+import pickle
+import threading
+import time
+from array import array
+
+TRADING_POST_CSV = "./Trading Post.csv"
+CATALOG_CACHE = "./.catalog.cache"
+CACHE_FORMAT = 1
+# How often get_catalog() looks at the CSV's mtime.
+RELOAD_CHECK_INTERVAL = 5.0
+
+REQUIRED_COLUMNS = ("Name", "Category", "Rarity", "Rarity Rating", "Cost")
+
+def parse_rarity_rating(value):
+    if isinstance(value, str):
+        value = value.strip().upper()
+        if value == "C":
+            return 0
+        if value[:1] in ("R", "I"):
+            try:
+                return int(value[1:])
+            except ValueError:
+                return None
+    return None
+
+class CatalogItem:
+    __slots__ = ("id", "name", "category", "rarity", "rarity_rating", "parsed_rarity", "cost", "weight")
+
+    def __init__(self, id, name, category, rarity, rarity_rating, parsed_rarity, cost):
+        self.id = id
+        self.name = name
+        self.category = category
+        self.rarity = rarity
+        self.rarity_rating = rarity_rating
+        self.parsed_rarity = parsed_rarity
+        self.cost = cost
+        self.weight = 1 / (parsed_rarity + 1)
+
+    def to_dict(self):
+        """The item as stored in a generated market."""
+        return {
+            "id": self.id,
+            "Name": self.name,
+            "Category": self.category,
+            "Rarity": self.rarity,
+            "Rarity Rating": self.rarity_rating,
+            "Cost": self.cost
+        }
+
+class Catalog:
+    """
+    The Trading Post table, loaded once into `__slots__` records with the
+    rarity already parsed, plus flat arrays for sampling: per-item weights,
+    parsed rarity and category number, the item indices of each category,
+    and the indices of items eligible for the Secret Stash.
+    """
+    __slots__ = ("items", "weights", "parsed_rarity", "categories", "category_codes", "category_indices", "stash_indices", "mtime_ns")
+
+    STASH_MIN_RARITY = 10
+
+    def __init__(self, rows, mtime_ns):
+        self.items = tuple(CatalogItem(*row) for row in rows)
+        self.weights = array("d", (item.weight for item in self.items))
+        self.parsed_rarity = array("i", (item.parsed_rarity for item in self.items))
+        category_indices = {}
+        for i, item in enumerate(self.items):
+            category_indices.setdefault(item.category, array("H")).append(i)
+        self.categories = tuple(category_indices)
+        self.category_indices = category_indices
+        codes = {category: code for code, category in enumerate(self.categories)}
+        self.category_codes = array("H", (codes[item.category] for item in self.items))
+        self.stash_indices = array("H", (i for i, item in enumerate(self.items) if item.parsed_rarity >= self.STASH_MIN_RARITY))
+        self.mtime_ns = mtime_ns
+
+    def __len__(self):
+        return len(self.items)
+
+def _read_csv(path):
+    """Returns the usable rows as (id, name, category, rarity, rarity_rating, parsed_rarity, cost) tuples."""
+    rows = []
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for record in csv.DictReader(f):
+            values = {key: (record.get(key) or "").strip() for key in REQUIRED_COLUMNS}
+            if not all(values.values()):
+                continue
+            parsed_rarity = parse_rarity_rating(values["Rarity Rating"])
+            if parsed_rarity is None:
+                continue
+            item_id = int(record["#"]) if (record.get("#") or "").strip().isdigit() else len(rows) + 1
+            rows.append((
+                item_id, values["Name"], values["Category"], values["Rarity"],
+                values["Rarity Rating"], parsed_rarity, values["Cost"]
+            ))
+    return rows
+
+def load_catalog(csv_path=TRADING_POST_CSV, cache_path=CATALOG_CACHE) -> Catalog:
+    """
+    Loads the catalog, preferring the compiled cache when it was built from
+    the CSV's current mtime and size, and rewriting the cache otherwise.
+    """
+    stat = os.stat(csv_path)
+    key = (CACHE_FORMAT, stat.st_mtime_ns, stat.st_size)
+    try:
+        with open(cache_path, "rb") as f:
+            cached_key, rows = pickle.load(f)
+        if cached_key == key:
+            return Catalog(rows, stat.st_mtime_ns)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError):
+        pass
+
+    rows = _read_csv(csv_path)
+    try:
+        tmp_path = f"{cache_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump((key, rows), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"Warning: could not write catalog cache {cache_path}: {e}")
+    return Catalog(rows, stat.st_mtime_ns)
+
+_catalog = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+def get_catalog() -> Catalog:
+    """Returns the current catalog, reloading it if the CSV has changed on disk."""
+    global _catalog, _checked_at
+    now = time.monotonic()
+    if _catalog is not None and now - _checked_at < RELOAD_CHECK_INTERVAL:
+        return _catalog
+    with _lock:
+        _checked_at = now
+        try:
+            mtime_ns = os.stat(TRADING_POST_CSV).st_mtime_ns
+        except OSError as e:
+            if _catalog is None:
+                raise
+            print(f"Warning: could not stat {TRADING_POST_CSV}, keeping the loaded catalog: {e}")
+            return _catalog
+        if _catalog is None or _catalog.mtime_ns != mtime_ns:
+            _catalog = load_catalog()
+        return _catalog
@@ -0,0 +1,127 @@
+import ast
+import operator
+import random
+import re
+from functools import lru_cache
+
+DICE_PATTERN = re.compile(r"(\d*)d(\d+)")
+# Guards against formulas like 100000d6 that would stall the event loop.
+MAX_DICE = 1000
+MAX_SIDES = 1000
+
+OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+}
+
+class FormulaError(ValueError):
+    pass
+
+def normalize_formula(formula: str) -> str:
+    return formula.lower().replace(" ", "").replace("x", "*")
+
+class CompiledFormula:
+    """
+    A dice formula parsed once into a plan.
+
+    `dice` holds (count, sides) for each dice term in the order they appear.
+    `plan` is the expression tree over those terms, made of
+    ("const", value), ("dice", index), ("neg", node) and
+    ("op", function, left, right) tuples. `evaluate` is the plan compiled
+    into nested closures; it takes one sum per dice term and works on
+    scalars and NumPy arrays alike.
+    """
+    __slots__ = ("source", "dice", "plan", "evaluate", "_segments")
+
+    def __init__(self, source, dice, plan, segments):
+        self.source = source
+        self.dice = dice
+        self.plan = plan
+        self.evaluate = _to_closure(plan)
+        self._segments = segments
+
+    def roll(self, rng=random):
+        """Rolls the formula, returning the same dict as Dice.roll_formula."""
+        rand = rng.random
+        sums = []
+        rolls_log = []
+        parsed = [self._segments[0]]
+        for i, (num, sides) in enumerate(self.dice):
+            rolls = [int(rand() * sides) + 1 for _ in range(num)]
+            sums.append(sum(rolls))
+            rolls_log.append(f"{num}d{sides}: {rolls}")
+            parsed.append(f"({'+'.join(map(str, rolls))})")
+            parsed.append(self._segments[i + 1])
+        return {
+            "original": self.source,
+            "parsed": "".join(parsed),
+            "rolls": rolls_log,
+            "total": self.evaluate(sums)
+        }
+
+def _to_closure(node):
+    kind = node[0]
+    if kind == "const":
+        value = node[1]
+        return lambda sums: value
+    if kind == "dice":
+        index = node[1]
+        return lambda sums: sums[index]
+    if kind == "neg":
+        operand = _to_closure(node[1])
+        return lambda sums: -operand(sums)
+    func, left, right = node[1], _to_closure(node[2]), _to_closure(node[3])
+    return lambda sums: func(left(sums), right(sums))
+
+def _to_plan(expr, dice_names):
+    if isinstance(expr, ast.BinOp) and type(expr.op) in OPERATORS:
+        return ("op", OPERATORS[type(expr.op)], _to_plan(expr.left, dice_names), _to_plan(expr.right, dice_names))
+    if isinstance(expr, ast.UnaryOp) and isinstance(expr.op, ast.USub):
+        return ("neg", _to_plan(expr.operand, dice_names))
+    if isinstance(expr, ast.Constant) and type(expr.value) in (int, float):
+        return ("const", expr.value)
+    if isinstance(expr, ast.Name) and expr.id in dice_names:
+        return ("dice", dice_names[expr.id])
+    raise FormulaError("Unsupported operation")
+
+@lru_cache(maxsize=1024)
+def _compile(source: str) -> CompiledFormula:
+    dice = []
+    segments = []
+    position = 0
+    expression = []
+    for match in DICE_PATTERN.finditer(source):
+        num = int(match.group(1)) if match.group(1) else 1
+        sides = int(match.group(2))
+        if not 1 <= num <= MAX_DICE or not 1 <= sides <= MAX_SIDES:
+            raise FormulaError(f"Dice must be between 1d1 and {MAX_DICE}d{MAX_SIDES}, got {match.group(0)}")
+        segments.append(source[position:match.start()])
+        expression.append(source[position:match.start()])
+        expression.append(f"_d{len(dice)}")
+        dice.append((num, sides))
+        position = match.end()
+    segments.append(source[position:])
+    expression.append(source[position:])
+
+    try:
+        node = ast.parse("".join(expression), mode="eval")
+    except SyntaxError as e:
+        raise FormulaError(f"Invalid formula: {e.msg}") from None
+    plan = _to_plan(node.body, {f"_d{i}": i for i in range(len(dice))})
+    return CompiledFormula(source, tuple(dice), plan, tuple(segments))
+
+def compile_formula(formula: str) -> CompiledFormula:
+    """
+    Returns the compiled plan for `formula`, parsing it only the first time
+    a given normalized formula is seen. Raises FormulaError if it is invalid.
+    """
+    if not formula or not formula.strip():
+        raise FormulaError("Formula is empty")
+    return _compile(normalize_formula(formula))
+
+def validate_formula(formula):
+    """Raises FormulaError unless `formula` is empty or a valid dice formula."""
+    if formula:
+        compile_formula(formula)
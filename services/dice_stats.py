@@ -0,0 +1,158 @@
+import operator
+from functools import lru_cache
+
+import numpy as np
+
+from services.dice import FormulaError, compile_formula
+
+# Dense convolutions longer than this go through the FFT instead of np.convolve.
+DIRECT_CONVOLVE_LIMIT = 4096
+# Largest support allowed for products and quotients of two random terms.
+MAX_OUTER_SUPPORT = 1_000_000
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+class Distribution:
+    """An exact discrete distribution: sorted unique `values` and their `probs`."""
+    __slots__ = ("values", "probs")
+
+    def __init__(self, values, probs):
+        self.values = values
+        self.probs = probs
+
+    @classmethod
+    def point(cls, value):
+        return cls(np.array([value], dtype=float), np.array([1.0]))
+
+    @classmethod
+    def merged(cls, values, probs):
+        """Builds a distribution from possibly repeated values, summing their probabilities."""
+        values = np.round(values.ravel(), 12)
+        unique, inverse = np.unique(values, return_inverse=True)
+        return cls(unique, np.bincount(inverse, weights=probs.ravel()))
+
+    @property
+    def is_integer(self):
+        return bool(np.all(self.values == np.floor(self.values)))
+
+    @property
+    def mean(self):
+        return float(np.dot(self.values, self.probs))
+
+    @property
+    def variance(self):
+        return float(np.dot((self.values - self.mean) ** 2, self.probs))
+
+    def sample(self, size, rng):
+        """Draws `size` values by inverse-CDF lookup."""
+        cdf = np.cumsum(self.probs)
+        cdf[-1] = 1.0
+        return self.values[np.searchsorted(cdf, rng.random(size), side="right")]
+
+    def percentile(self, q):
+        """The smallest value whose cumulative probability reaches q percent."""
+        cdf = np.cumsum(self.probs)
+        return float(self.values[min(np.searchsorted(cdf, q / 100 - 1e-12), len(self.values) - 1)])
+
+    def dense(self):
+        """
+        Returns (offset, pmf, support) with pmf[i] the probability of
+        offset + i and support[i] whether it is a possible outcome at all;
+        integer supports only.
+        """
+        offset = int(self.values[0])
+        positions = self.values.astype(np.int64) - offset
+        pmf = np.zeros(int(self.values[-1]) - offset + 1)
+        pmf[positions] = self.probs
+        support = np.zeros(len(pmf), dtype=bool)
+        support[positions] = True
+        return offset, pmf, support
+
+    @classmethod
+    def from_dense(cls, offset, pmf, support=None):
+        """
+        Builds a distribution from a dense pmf. `support` marks the entries
+        that are possible outcomes, by default the nonzero ones. Convolution
+        results need it passed: far-tail probabilities underflow to 0 and
+        FFT round-off can't be told apart from them by value, so negative
+        noise is clipped to 0 and the support is kept whole.
+        """
+        pmf = np.clip(pmf, 0, None)
+        pmf /= pmf.sum()
+        keep = np.nonzero(pmf > 0 if support is None else support)[0]
+        return cls((keep + offset).astype(float), pmf[keep])
+
+def _convolve(a, b):
+    if len(a) + len(b) - 1 <= DIRECT_CONVOLVE_LIMIT:
+        return np.convolve(a, b)
+    size = len(a) + len(b) - 1
+    return np.fft.irfft(np.fft.rfft(a, size) * np.fft.rfft(b, size), size)
+
+def _convolve_power(pmf, n):
+    """pmf convolved with itself n times, by repeated squaring (or one FFT power when large)."""
+    size = (len(pmf) - 1) * n + 1
+    if size > DIRECT_CONVOLVE_LIMIT:
+        return np.fft.irfft(np.fft.rfft(pmf, size) ** n, size)
+    result = np.array([1.0])
+    while n:
+        if n & 1:
+            result = np.convolve(result, pmf)
+        n >>= 1
+        if n:
+            pmf = np.convolve(pmf, pmf)
+    return result
+
+def dice_distribution(num, sides):
+    """Distribution of the sum of `num` dice with `sides` sides."""
+    pmf = _convolve_power(np.full(sides, 1.0 / sides), num)
+    # Every total from num to num * sides can be rolled.
+    return Distribution.from_dense(num, pmf, support=np.ones(len(pmf), dtype=bool))
+
+def _combine(func, a, b):
+    if func in (operator.add, operator.sub):
+        if func is operator.sub:
+            b = Distribution(-b.values[::-1], b.probs[::-1])
+        if a.is_integer and b.is_integer:
+            offset_a, pmf_a, support_a = a.dense()
+            offset_b, pmf_b, support_b = b.dense()
+            # The number of ways to reach each sum is an integer, so the support
+            # survives underflow and FFT round-off even where the probability doesn't.
+            support = _convolve(support_a.astype(float), support_b.astype(float)) > 0.5
+            return Distribution.from_dense(offset_a + offset_b, _convolve(pmf_a, pmf_b), support)
+        func = operator.add
+    if len(a.values) * len(b.values) > MAX_OUTER_SUPPORT:
+        raise FormulaError("Formula is too complex to compute exactly")
+    if func is operator.truediv and np.any(b.values == 0):
+        raise FormulaError("Formula can divide by zero")
+    return Distribution.merged(func(a.values[:, None], b.values[None, :]), np.outer(a.probs, b.probs))
+
+def _evaluate(node, dice):
+    kind = node[0]
+    if kind == "const":
+        return Distribution.point(node[1])
+    if kind == "dice":
+        return dice_distribution(*dice[node[1]])
+    if kind == "neg":
+        operand = _evaluate(node[1], dice)
+        return Distribution(-operand.values[::-1], operand.probs[::-1])
+    return _combine(node[1], _evaluate(node[2], dice), _evaluate(node[3], dice))
+
+def sum_distributions(distributions):
+    """Distribution of the sum of independent draws from each of `distributions`."""
+    total = Distribution.point(0)
+    for distribution in distributions:
+        total = _combine(operator.add, total, distribution)
+    return total
+
+@lru_cache(maxsize=256)
+def _distribution(source):
+    compiled = compile_formula(source)
+    return _evaluate(compiled.plan, compiled.dice)
+
+def formula_distribution(formula: str) -> Distribution:
+    """
+    Returns the exact distribution of `formula`. Each dice term is the
+    convolution of its dice; terms are combined by convolution for + and -
+    and by outer products otherwise. Results are memoized per formula.
+    """
+    return _distribution(compile_formula(formula).source)
@@ -0,0 +1,60 @@
+import asyncio
+from typing import NamedTuple
+from db.aio import get_gang_stats_by_campaign, update_gang_stats
+from services.yaktribe import fetch_gang_page, normalize_ganger_name, parse_gang_page
+
+class SyncResult(NamedTuple):
+    updated: list    # (gang_id, gang_name, [changed fields])
+    unchanged: list  # gang_id
+    failed: list     # (gang_id, gang_name, error message)
+
+async def _refresh_gang(gang: dict, semaphore: asyncio.Semaphore):
+    """
+    Returns the parsed stats of one gang's current Yaktribe page.
+
+    A 304 still re-parses the stored copy: the page can be cached while the
+    gang's stats are not (its first parse or the write that followed may
+    have failed), so only the diff against the database says whether the
+    gang is up to date.
+    """
+    async with semaphore:
+        html, _ = await fetch_gang_page(gang["yaktribe_url"])
+    return await asyncio.get_running_loop().run_in_executor(None, parse_gang_page, html)
+
+async def sync_campaign_gangs(campaign_id: int, workers: int = 8) -> SyncResult:
+    """
+    Re-imports every gang in a campaign from Yaktribe.
+
+    Pages are fetched concurrently, at most `workers` at a time (the shared
+    HTTP client applies its own cap as well), using conditional GETs so
+    unchanged pages aren't downloaded again. Parsing runs on worker threads.
+    Every page is diffed against the stored stats, and only gangs whose stats
+    actually differ are written, in a single batched transaction.
+    """
+    gangs = await get_gang_stats_by_campaign(campaign_id)
+    semaphore = asyncio.Semaphore(workers)
+    results = await asyncio.gather(
+        *(_refresh_gang(gang, semaphore) for gang in gangs),
+        return_exceptions=True
+    )
+
+    updates, updated, unchanged, failed = [], [], [], []
+    for gang, data in zip(gangs, results):
+        if isinstance(data, Exception):
+            failed.append((gang["id"], gang["stats"]["name"], str(data)))
+            continue
+        # Gangers stored by the old parser carry markup; compare them in the
+        # current form so they don't all show up as changed.
+        stored = dict(gang["stats"], gangers=[normalize_ganger_name(name) for name in gang["stats"]["gangers"]])
+        changed_fields = [key for key, value in data.items() if stored.get(key) != value]
+        if not changed_fields:
+            unchanged.append(gang["id"])
+            if gang["stats"]["gangers"] != data["gangers"]:
+                # Rewrite the legacy names quietly.
+                updates.append((gang["id"], data))
+            continue
+        updates.append((gang["id"], data))
+        updated.append((gang["id"], data["name"], changed_fields))
+
+    await update_gang_stats(campaign_id, updates)
+    return SyncResult(updated, unchanged, failed)
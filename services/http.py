@@ -0,0 +1,78 @@
+import asyncio
+import random
+from typing import NamedTuple, Optional
+import aiohttp
+from multidict import CIMultiDict
+
+# Statuses worth retrying: rate limiting and transient server errors.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class HttpError(Exception):
+    pass
+
+class HttpResponse(NamedTuple):
+    status: int
+    headers: CIMultiDict
+    body: bytes
+
+    @property
+    def text(self) -> str:
+        return self.body.decode("utf-8", errors="replace")
+
+class HttpClient:
+    """
+    Async HTTP client built around one shared keep-alive aiohttp session.
+
+    Every request has a total timeout, is retried with exponential backoff
+    and jitter on connection errors, timeouts and retryable statuses, and
+    holds a slot of a semaphore so at most `max_concurrency` requests are in
+    flight at once. The session and semaphore are created lazily inside the
+    running event loop.
+    """
+    def __init__(self, timeout=15.0, retries=3, backoff=0.5, max_concurrency=4, headers=None):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_concurrency = max_concurrency
+        self.headers = headers or {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers=self.headers,
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency, ttl_dns_cache=300),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def get(self, url: str, headers: Optional[dict] = None) -> HttpResponse:
+        """
+        GETs `url`, returning 2xx and 304 responses. Raises HttpError for other
+        statuses, or once all retries are used up.
+        """
+        session = self._get_session()
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1) * (0.5 + random.random()))
+            try:
+                async with self._semaphore:
+                    async with session.get(url, headers=headers) as resp:
+                        body = await resp.read()
+                        if resp.status in RETRY_STATUSES:
+                            last_error = HttpError(f"{url} returned HTTP {resp.status}")
+                            continue
+                        if resp.status >= 400:
+                            raise HttpError(f"{url} returned HTTP {resp.status}")
+                        return HttpResponse(resp.status, CIMultiDict(resp.headers), body)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                last_error = HttpError(f"Request to {url} failed: {e or type(e).__name__}")
+        raise last_error
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -0,0 +1,103 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+import numpy as np
+from db.aio import get_campaigns_due_for_rotation, save_market_data_bulk
+from services.catalog import Catalog, get_catalog
+
+TRADING_POST_SIZE = 20
+SECRET_STASH_SIZE = 5
+
+# Markets older than this are regenerated by the rotation task.
+MARKET_ROTATION_HOURS = float(os.getenv("MARKET_ROTATION_HOURS", "168"))
+ROTATION_CHUNK_SIZE = 250
+
+def sample_market(
+    catalog: Catalog,
+    rng: Optional[np.random.Generator] = None,
+    trading_post_size: int = TRADING_POST_SIZE,
+    stash_size: int = SECRET_STASH_SIZE
+) -> tuple[list[dict], list[dict]]:
+    """
+    Draws a Trading Post and a Secret Stash in one pass over the catalog.
+
+    Trading Post items are drawn by weight without replacement using
+    Efraimidis-Spirakis keys: every item gets the key log(u) / weight, and
+    sorting by key gives a weighted random order. The best-keyed item of each
+    category is exactly a weighted draw from that category, which covers the
+    one-per-category guarantee; the rest of the post is filled from the top
+    of the same order, skipping duplicate names. The Secret Stash is a
+    uniform draw of distinct names from the high-rarity items.
+
+    Args:
+        catalog: The loaded Trading Post catalog.
+        rng: NumPy random generator; pass a seeded one for reproducible markets.
+
+    Returns:
+        (trading_post, secret_stash) as lists of item dicts.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    weights = np.frombuffer(catalog.weights, dtype=np.float64)
+    codes = np.frombuffer(catalog.category_codes, dtype=np.uint16)
+
+    # 1 - random() is in (0, 1], so every key is finite.
+    keys = np.log1p(-rng.random(len(weights))) / weights
+    order = np.argsort(-keys, kind="stable")
+
+    # First appearance of each category in key order = its weighted pick.
+    _, first_positions = np.unique(codes[order], return_index=True)
+    guaranteed = order[first_positions]
+
+    picked = [catalog.items[i] for i in guaranteed]
+    names = {item.name for item in picked}
+    chosen = set(guaranteed.tolist())
+    for i in order.tolist():
+        if len(picked) >= trading_post_size:
+            break
+        item = catalog.items[i]
+        if i in chosen or item.name in names:
+            continue
+        picked.append(item)
+        names.add(item.name)
+
+    if len(picked) < trading_post_size:
+        print(f"Only generated {len(picked)} trading post items from a catalog of {len(catalog)}")
+
+    stash = []
+    stash_names = set()
+    if len(catalog.stash_indices):
+        for i in rng.permutation(np.frombuffer(catalog.stash_indices, dtype=np.uint16)).tolist():
+            if len(stash) >= stash_size:
+                break
+            item = catalog.items[i]
+            if item.name not in stash_names:
+                stash.append(item)
+                stash_names.add(item.name)
+
+    return [item.to_dict() for item in picked], [item.to_dict() for item in stash]
+
+def _generate_chunk(campaign_ids):
+    catalog = get_catalog()
+    rng = np.random.default_rng()
+    return [(campaign_id, *sample_market(catalog, rng)) for campaign_id in campaign_ids]
+
+async def rotate_markets(max_age_hours: float = MARKET_ROTATION_HOURS) -> int:
+    """
+    Regenerates every market older than `max_age_hours`.
+
+    Stale campaigns come from the generated_at index, markets are generated
+    in chunks on worker threads, and everything is written back with one
+    bulk upsert. Returns the number of markets rotated.
+    """
+    cutoff = (datetime.utcnow() - timedelta(hours=max_age_hours)).isoformat()
+    campaign_ids = await get_campaigns_due_for_rotation(cutoff)
+    if not campaign_ids:
+        return 0
+
+    loop = asyncio.get_running_loop()
+    chunks = [campaign_ids[i:i + ROTATION_CHUNK_SIZE] for i in range(0, len(campaign_ids), ROTATION_CHUNK_SIZE)]
+    results = await asyncio.gather(*(loop.run_in_executor(None, _generate_chunk, chunk) for chunk in chunks))
+    markets = [market for chunk in results for market in chunk]
+    await save_market_data_bulk(markets)
+    return len(markets)
@@ -0,0 +1,102 @@
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from services.dice import FormulaError, compile_formula
+from services.dice_stats import PERCENTILES, Distribution, formula_distribution, sum_distributions
+
+# Asset types that pay out every payday; anything else only pays when sold.
+PAYDAY_ASSET_TYPES = ('Territory', 'Hanger-On', 'Skill', 'Other')
+
+def is_payday_asset(asset_type, should_sell):
+    return asset_type in PAYDAY_ASSET_TYPES or bool(should_sell)
+
+class IncomeProjection(NamedTuple):
+    gang_id: Optional[int]
+    name: str
+    mean: float
+    std: float
+    percentiles: Dict[int, float]
+
+class GangPayday(NamedTuple):
+    gang_id: int
+    gang_name: str
+    total: float
+    summary: list
+
+def roll_asset(name, asset_type, value, formula):
+    """Rolls one asset's income, returning its payday summary entry."""
+    asset_total = 0
+    components = []
+    if value:
+        asset_total += value
+        components.append(f"Flat: {value}")
+    if formula:
+        try:
+            result = compile_formula(formula).roll()
+        except Exception as e:
+            result = {"original": formula, "total": 0}
+            print(f"Warning: could not roll payday formula {formula!r} for {name}: {e}")
+        asset_total += result["total"]
+        components.append(f"Roll: {result['total']} from {result['original']}")
+    return {
+        "name": name,
+        "type": asset_type,
+        "components": components,
+        "subtotal": asset_total
+    }
+
+def roll_campaign_payday(rows) -> List[GangPayday]:
+    """Rolls every gang's payday in memory from get_payday_assets_by_campaign() rows."""
+    gangs = {}
+    for gang_id, gang_name, name, asset_type, value, formula, should_sell in rows:
+        _, summary = gangs.setdefault(gang_id, (gang_name, []))
+        if asset_type is not None and is_payday_asset(asset_type, should_sell):
+            summary.append(roll_asset(name, asset_type, value, formula))
+    return [
+        GangPayday(gang_id, gang_name, sum(entry["subtotal"] for entry in summary), summary)
+        for gang_id, (gang_name, summary) in gangs.items()
+    ]
+
+def _summarize(gang_id, name, totals):
+    return IncomeProjection(
+        gang_id, name,
+        float(totals.mean()), float(totals.std()),
+        dict(zip(PERCENTILES, np.percentile(totals, PERCENTILES).tolist()))
+    )
+
+def project_paydays(rows, simulations=100_000, rng=None):
+    """
+    Simulates `simulations` paydays for a campaign without touching the ledger.
+
+    `rows` are get_payday_assets_by_campaign() rows. Each gang's income
+    distribution is built exactly from its paying assets (static values plus
+    the convolution of their formulas' distributions), then sampled once per
+    simulated payday; the campaign total is the sum of the gangs' draws.
+    Returns (per-gang projections, campaign projection, invalid formulas skipped).
+    """
+    rng = rng or np.random.default_rng()
+    gangs = {}
+    skipped = []
+    for gang_id, gang_name, _, asset_type, value, formula, should_sell in rows:
+        name, parts = gangs.setdefault(gang_id, (gang_name, []))
+        if asset_type is None or not is_payday_asset(asset_type, should_sell):
+            continue
+        if value:
+            parts.append(Distribution.point(value))
+        if formula:
+            try:
+                parts.append(formula_distribution(formula))
+            except FormulaError:
+                skipped.append(formula)
+
+    totals = np.zeros((len(gangs), simulations))
+    for row, (name, parts) in enumerate(gangs.values()):
+        totals[row] = sum_distributions(parts).sample(simulations, rng)
+
+    projections: List[IncomeProjection] = [
+        _summarize(gang_id, name, totals[row])
+        for row, (gang_id, (name, _)) in enumerate(gangs.items())
+    ]
+    campaign = _summarize(None, "Campaign", totals.sum(axis=0))
+    return projections, campaign, skipped
@@ -0,0 +1,122 @@
+import asyncio
+from datetime import datetime
+from typing import Awaitable, Callable, Optional
+
+from db.aio import (
+    create_payday_job,
+    get_payday_job,
+    get_unfinished_payday_jobs,
+    get_pending_job_gangs,
+    complete_job_gangs,
+    skip_job_gangs,
+    set_payday_job_message,
+    finish_payday_job,
+    get_payday_assets_by_campaign,
+)
+from db.payday_jobs import PaydayJob
+from services.payday import GangPayday, roll_campaign_payday
+
+# Gangs paid (and checkpointed) per transaction.
+PAYDAY_BATCH_SIZE = 50
+
+def current_payday_cycle() -> str:
+    """The default payday cycle: today's UTC date, so a campaign is paid at most once a day unless a cycle is named."""
+    return datetime.utcnow().date().isoformat()
+
+class PaydayWorker:
+    """
+    Runs campaign paydays as background jobs, one at a time.
+
+    Jobs live in the payday_jobs table, so anything queued or interrupted
+    by a restart is picked up again by `start()`. Each batch of gangs is
+    paid and checkpointed in one transaction, so a resumed job only pays
+    the gangs that are still pending. `on_progress` is awaited with the
+    refreshed job and the paydays just committed after every batch, so
+    results can be shown while later batches run, and with an empty list
+    when the job finishes or fails.
+    """
+    def __init__(self, batch_size: int = PAYDAY_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.on_progress: Optional[Callable[[PaydayJob, list[GangPayday]], Awaitable[None]]] = None
+        self._queue = asyncio.Queue()
+        self._queued = set()
+        self._task = None
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+        for job_id in await get_unfinished_payday_jobs():
+            self._enqueue(job_id)
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def submit(self, campaign_id: int, user_id: int, cycle: Optional[str] = None,
+                     channel_id: Optional[int] = None, message_id: Optional[int] = None):
+        """
+        Queues the payday for `campaign_id` and `cycle`. Submitting a cycle
+        that already has a job does not pay anyone again; a failed job is
+        re-queued and resumes from its checkpoints, reporting to the new
+        `message_id`.
+
+        Returns:
+            (PaydayJob, created), or (None, False) if the campaign has no gangs.
+        """
+        job, created = await create_payday_job(campaign_id, cycle or current_payday_cycle(), user_id, channel_id, message_id)
+        if job and not created and job.status == 'failed' and message_id is not None:
+            await set_payday_job_message(job.id, channel_id, message_id)
+            job = job._replace(channel_id=channel_id, message_id=message_id)
+        if job and (created or job.status == 'failed'):
+            self._enqueue(job.id)
+        return job, created
+
+    def _enqueue(self, job_id):
+        if job_id not in self._queued:
+            self._queued.add(job_id)
+            self._queue.put_nowait(job_id)
+
+    async def _run(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._process(job_id)
+            except Exception as e:
+                print(f"Error running payday job {job_id}: {e}")
+                await finish_payday_job(job_id, 'failed', str(e))
+                await self._report(job_id)
+            finally:
+                self._queued.discard(job_id)
+
+    async def _process(self, job_id):
+        job = await get_payday_job(job_id)
+        pending = set(await get_pending_job_gangs(job_id))
+        if pending:
+            rows = await get_payday_assets_by_campaign(job.campaign_id)
+            paydays = [p for p in roll_campaign_payday(rows) if p.gang_id in pending]
+            missing = pending - {p.gang_id for p in paydays}
+            if missing:
+                await skip_job_gangs(job_id, sorted(missing))
+            for i in range(0, len(paydays), self.batch_size):
+                batch = paydays[i:i + self.batch_size]
+                paid = set(await complete_job_gangs(job_id, [(p.gang_id, p.total, p.summary) for p in batch], job.requested_by))
+                await self._report(job_id, [p for p in batch if p.gang_id in paid])
+        await finish_payday_job(job_id, 'done')
+        await self._report(job_id)
+
+    async def _report(self, job_id, paid=()):
+        if self.on_progress is None:
+            return
+        try:
+            await self.on_progress(await get_payday_job(job_id), list(paid))
+        except Exception as e:
+            print(f"Warning: could not report progress for payday job {job_id}: {e}")
+
+worker = PaydayWorker()
@@ -0,0 +1,187 @@
+import html as html_lib
+import os
+import re
+from html.parser import HTMLParser
+from urllib.parse import urlsplit, urlunsplit
+from db.aio import get_cached_page, save_page, touch_page
+from services.http import HttpClient
+
+GANG_URL_PATTERN = re.compile(r'https://yaktribe\.games/underhive/print/gang/(\d+)\?.*')
+
+# Point this at a local stand-in server (see tools/yaktribe_stub.py) to test
+# without touching the real site.
+YAKTRIBE_BASE_URL = os.getenv("YAKTRIBE_BASE_URL")
+
+client = HttpClient(
+    timeout=float(os.getenv("YAKTRIBE_TIMEOUT", "15")),
+    retries=3,
+    max_concurrency=int(os.getenv("YAKTRIBE_CONCURRENCY", "8")),
+    headers={"User-Agent": "necromunda-discord-bot"},
+)
+
+def parse_gang_url(yaktribe_url: str):
+    """Returns the Yaktribe gang ID for a gang print URL, or None if the URL isn't one."""
+    match = GANG_URL_PATTERN.match(yaktribe_url)
+    return int(match.group(1)) if match else None
+
+def _request_url(yaktribe_url: str) -> str:
+    if not YAKTRIBE_BASE_URL:
+        return yaktribe_url
+    base = urlsplit(YAKTRIBE_BASE_URL)
+    parts = urlsplit(yaktribe_url)
+    return urlunsplit((base.scheme, base.netloc, parts.path, parts.query, parts.fragment))
+
+class _StopParsing(Exception):
+    pass
+
+class GangPageParser(HTMLParser):
+    """
+    Single-pass parser for Yaktribe gang print pages.
+
+    Instead of building a DOM it streams the tokens and only keeps what
+    parse_gang_page needs: the gang name from the first `tr.subheader
+    td[colspan=2]`, the label/value rows of the second table, and the
+    fighter names from the sixth. It stops as soon as the fighter table
+    closes.
+    """
+    INFO_TABLE = 1
+    FIGHTER_TABLE = 5
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.name = None
+        self.gang_info = {}
+        self.gangers = []
+        self._table_count = 0
+        self._open_tables = []
+        self._in_subheader = False
+        self._name_parts = None
+        self._row = None
+        self._row_counts = {self.INFO_TABLE: 0, self.FIGHTER_TABLE: 0}
+        self._cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "table":
+            self._open_tables.append(self._table_count)
+            self._table_count += 1
+        elif tag == "tr":
+            attrs = dict(attrs)
+            self._in_subheader = "subheader" in (attrs.get("class") or "").split()
+            self._row = {"th": None, "td": []}
+            for table in (self.INFO_TABLE, self.FIGHTER_TABLE):
+                if table in self._open_tables:
+                    self._row_counts[table] += 1
+        elif tag in ("td", "th") and self._row is not None:
+            if tag == "td" and self.name is None and self._in_subheader and dict(attrs).get("colspan") == "2":
+                self._name_parts = []
+            self._cell = {"tag": tag, "parts": [], "before_br": None}
+        elif tag == "br" and self._cell is not None and self._cell["before_br"] is None:
+            self._cell["before_br"] = list(self._cell["parts"])
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell["parts"].append(data)
+        if self._name_parts is not None:
+            self._name_parts.append(data)
+
+    def handle_endtag(self, tag):
+        if tag in ("td", "th") and self._cell is not None:
+            if self._name_parts is not None:
+                self.name = _text(self._name_parts)
+                self._name_parts = None
+            if tag == "th" and self._row["th"] is None:
+                self._row["th"] = self._cell
+            elif tag == "td":
+                self._row["td"].append(self._cell)
+            self._cell = None
+        elif tag == "tr" and self._row is not None:
+            self._finish_row()
+            self._row = None
+            self._in_subheader = False
+        elif tag == "table" and self._open_tables:
+            if self._open_tables.pop() == self.FIGHTER_TABLE:
+                raise _StopParsing()
+
+    def _finish_row(self):
+        row = self._row
+        # The first row of both tables is a header.
+        if self.INFO_TABLE in self._open_tables and self._row_counts[self.INFO_TABLE] > 1:
+            if row["th"] is not None and row["td"]:
+                label = _text(row["th"]["parts"]).rstrip(":")
+                self.gang_info[label] = _text(row["td"][0]["parts"])
+        if self.FIGHTER_TABLE in self._open_tables and self._row_counts[self.FIGHTER_TABLE] > 1:
+            if len(row["td"]) >= 2:
+                cell = row["td"][1]
+                parts = cell["before_br"] if cell["before_br"] is not None else cell["parts"]
+                self.gangers.append("".join(parts).strip())
+
+LEGACY_MARKUP = re.compile(r"<br\s*/?>.*|<[^>]+>", re.S)
+
+def normalize_ganger_name(name: str) -> str:
+    """
+    Converts a ganger name stored by the old BeautifulSoup parser to what
+    parse_gang_page returns. The old parser kept the cell's raw markup, so
+    names came out as 'Vex Karnak<br/>Leader' with entities still escaped.
+    Names already in the current form are returned unchanged.
+    """
+    return html_lib.unescape(LEGACY_MARKUP.sub("", name)).strip()
+
+def _text(parts):
+    # Matches BeautifulSoup's get_text(strip=True).
+    return "".join(part.strip() for part in parts)
+
+def parse_gang_page(html: str) -> dict:
+    parser = GangPageParser()
+    try:
+        parser.feed(html)
+        parser.close()
+    except _StopParsing:
+        pass
+
+    if parser._table_count <= GangPageParser.FIGHTER_TABLE:
+        raise ValueError("Page does not look like a Yaktribe gang roster")
+
+    gang_info = parser.gang_info
+    return {
+        "name": parser.name or "Unknown",
+        "type": gang_info.get("Gang Type", "Unknown"),
+        "credits": int(gang_info.get("Credits", "0")),
+        "meat": int(gang_info.get("Meat", "0")),
+        "rating": int(gang_info.get("Gang Rating", "0")),
+        "rep": int(gang_info.get("Reputation", "0")),
+        "wealth": int(gang_info.get("Wealth", "0")),
+        "gangers": parser.gangers
+    }
+
+async def fetch_gang_page(yaktribe_url: str, offline: bool = False):
+    """
+    Returns (html, changed) for a gang page.
+
+    The last copy of every page is kept compressed in the database along with
+    its ETag/Last-Modified, and re-fetches are conditional GETs: a 304 reuses
+    the stored copy and reports `changed=False`. With `offline=True` the
+    stored copy is returned without touching the network (None if there is
+    none).
+    """
+    cached = await get_cached_page(yaktribe_url)
+    if offline:
+        return (cached.html, False) if cached else (None, False)
+
+    headers = {}
+    if cached:
+        if cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+
+    response = await client.get(_request_url(yaktribe_url), headers=headers)
+    if response.status == 304 and cached:
+        await touch_page(yaktribe_url)
+        return cached.html, False
+
+    html = response.text
+    await save_page(yaktribe_url, html, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+    return html, True
+
+async def close():
+    await client.close()
@@ -0,0 +1,86 @@
+"""
+Benchmarks market generation: the NumPy Efraimidis-Spirakis sampler in
+services/market.py against the previous retry loop, which drew one
+weighted item at a time and rejected duplicates.
+
+    python tools/bench_market_sampling.py [--number 2000]
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.catalog import get_catalog
+from services.market import sample_market
+
+# The generator cogs/marketplace.py used before services/market.py, kept for comparison.
+def legacy_generate_market_data():
+    catalog = get_catalog()
+    trading_post = []
+
+    # Ensure at least one item per category
+    for category in catalog.categories:
+        item = legacy_weighted_choice(catalog, catalog.category_indices[category])
+        if item is not None:
+            trading_post.append(item.to_dict())
+
+    # Fill the rest to make 20 unique entries
+    all_indices = range(len(catalog))
+    selected_names = {item['Name'] for item in trading_post}
+    attempts = 0
+    while len(trading_post) < 20 and attempts < 1000:
+        item = legacy_weighted_choice(catalog, all_indices)
+        attempts += 1
+        if item and item.name not in selected_names:
+            trading_post.append(item.to_dict())
+            selected_names.add(item.name)
+
+    if len(trading_post) < 20:
+        print(f"Only generated {len(trading_post)} items after {attempts} attempts")
+
+    # Secret Stash: 5 unique items with Rarity/Illegal >= 10
+    stash_items = []
+    stash_selected = set()
+    stash_attempts = 0
+    while len(stash_items) < 5 and stash_attempts < 500:
+        if not catalog.stash_indices:
+            break
+        item = catalog.items[random.choice(catalog.stash_indices)]
+        stash_attempts += 1
+        if item.name not in stash_selected:
+            stash_items.append(item.to_dict())
+            stash_selected.add(item.name)
+
+    return trading_post, stash_items
+
+def legacy_weighted_choice(catalog, indices):
+    if not indices:
+        return None
+    weights = [catalog.weights[i] for i in indices]
+    return catalog.items[random.choices(indices, weights=weights)[0]]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=2000, help="Markets generated per implementation")
+    args = parser.parse_args()
+
+    catalog = get_catalog()
+    rng = np.random.default_rng(0)
+    random.seed(0)
+
+    fast = timeit.timeit(lambda: sample_market(catalog, rng), number=args.number) / args.number
+    slow = timeit.timeit(legacy_generate_market_data, number=args.number) / args.number
+    print(f"NumPy ES sampler: {fast * 1e6:9.1f} us/market")
+    print(f"Retry loop:       {slow * 1e6:9.1f} us/market ({slow / fast:.1f}x slower)")
+
+    a = sample_market(catalog, np.random.default_rng(42))
+    b = sample_market(catalog, np.random.default_rng(42))
+    print(f"Seeded runs reproducible: {a == b}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmarks the streaming Yaktribe parser against the original
+BeautifulSoup implementation on the saved pages in tools/fixtures/yaktribe/.
+
+    python tools/bench_yaktribe_parser.py [--number 200]
+
+The BeautifulSoup half is skipped if beautifulsoup4 isn't installed.
+"""
+import argparse
+import glob
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.yaktribe import normalize_ganger_name, parse_gang_page
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "yaktribe")
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+else:
+    # The parser db.gangs used before the streaming one, kept verbatim for comparison.
+    def legacy_parse_gang_page(html):
+        soup = BeautifulSoup(html, 'html.parser')
+
+        # Gang name
+        name_tag = soup.select_one("tr.subheader td[colspan='2']")
+        name = name_tag.get_text(strip=True) if name_tag else "Unknown"
+
+        # Gang info table
+        gang_info = {}
+        for row in soup.select("table")[1].select("tr")[1:]:
+            if row.th and row.td:
+                label = row.th.get_text(strip=True).rstrip(":")
+                value = row.td.get_text(strip=True)
+                gang_info[label] = value
+
+        gang_type = gang_info.get("Gang Type", "Unknown")
+        credits = int(gang_info.get("Credits", "0"))
+        meat = int(gang_info.get("Meat", "0"))
+        rating = int(gang_info.get("Gang Rating", "0"))
+        rep = int(gang_info.get("Reputation", "0"))
+        wealth = int(gang_info.get("Wealth", "0"))
+
+        # Gangers
+        gangers = []
+        for fighter_row in soup.select("table")[5].select("tr")[1:]:
+            name_cell = fighter_row.select_one("td:nth-of-type(2)")
+            if name_cell:
+                name_parts = name_cell.decode_contents().split("<br>")
+                fighter_name = name_parts[0].strip()
+                gangers.append(fighter_name)
+
+        return {
+            "name": name,
+            "type": gang_type,
+            "credits": credits,
+            "meat": meat,
+            "rating": rating,
+            "rep": rep,
+            "wealth": wealth,
+            "gangers": gangers
+        }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=200, help="Parses per page per parser")
+    args = parser.parse_args()
+
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+        name = os.path.basename(path)
+
+        data = parse_gang_page(html)
+        fast = timeit.timeit(lambda: parse_gang_page(html), number=args.number) / args.number
+        print(f"{name}: streaming parser  {fast * 1e6:9.1f} us/page")
+
+        if BeautifulSoup is None:
+            print(f"{name}: beautifulsoup4 not installed, skipping the legacy parser")
+            continue
+        legacy = legacy_parse_gang_page(html)
+        slow = timeit.timeit(lambda: legacy_parse_gang_page(html), number=args.number) / args.number
+        print(f"{name}: legacy bs4 parser {slow * 1e6:9.1f} us/page ({slow / fast:.1f}x slower)")
+
+        stats = ("name", "type", "credits", "meat", "rating", "rep", "wealth")
+        mismatched = [key for key in stats if data[key] != legacy[key]]
+        if mismatched:
+            print(f"{name}: parsers disagree on {mismatched}")
+        if data["gangers"] != legacy["gangers"]:
+            # The legacy parser kept the cell markup ('Vex Karnak<br/>Leader');
+            # normalize_ganger_name maps its output to the streaming parser's.
+            intended = [normalize_ganger_name(g) for g in legacy["gangers"]] == data["gangers"]
+            print(f"{name}: gangers differ{' (intended, legacy markup stripped)' if intended else ''}:")
+            for old, new in zip(legacy["gangers"], data["gangers"]):
+                if old != new:
+                    print(f"    {old!r} -> {new!r}")
+            if len(legacy["gangers"]) != len(data["gangers"]):
+                print(f"    legacy has {len(legacy['gangers'])} gangers, streaming has {len(data['gangers'])}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+Checks the query plan of every SQL statement the db/* functions issue.
+
+Seeds a synthetic database at the size of a busy deployment, runs each
+db function with tracing enabled, and runs EXPLAIN QUERY PLAN on every
+statement it executed. A statement fails the check if its plan scans a
+large table from end to end or sorts through a temp B-tree. Index
+regressions don't show up in a small dev database; this makes them fail
+here instead of turning into latency in production.
+
+    python tools/check_query_plans.py [--campaigns 300] [--verbose]
+
+Exits with status 1 if any statement fails. ALLOWED lists the plans
+that are intentional, with the reason.
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db
+from db.pool import ConnectionPool
+
+# A SCAN of a table with at least this many rows counts as a full scan.
+LARGE_TABLE_ROWS = 1000
+
+GANGS_PER_CAMPAIGN = 15
+ASSETS_PER_GANG = 10
+TRANSACTIONS_PER_GANG = 40
+OFFERS_PER_CAMPAIGN = 60
+
+# Plans that are expected, as (function, start of plan detail), and why.
+ALLOWED = {
+    ("verify_balances", "SCAN gang_transactions"): "admin audit of the whole ledger",
+    ("verify_balances", "SCAN gang_balances"): "admin audit of every balance",
+    ("get_market_data", "USE TEMP B-TREE FOR ORDER BY"): "sorts one market's couple of dozen items",
+    ("find_campaigns_stocking", "USE TEMP B-TREE FOR ORDER BY"): "sorts only one server's matching market rows",
+    ("payday_jobs", "USE TEMP B-TREE FOR ORDER BY"): "sorts only unfinished jobs, a handful at most",
+}
+
+IGNORED_STATEMENTS = re.compile(r"^\s*(--|BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE|PRAGMA|ANALYZE|CREATE|DROP|ALTER)", re.I)
+TABLE_REFERENCE = re.compile(r"\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.I)
+SQL_KEYWORDS = {"where", "on", "set", "join", "left", "inner", "cross", "order", "group", "limit", "values", "using", "select", "default"}
+
+class TracingPool(ConnectionPool):
+    """A ConnectionPool that records every statement its connections run, tagged with `label`."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.label = None
+        self.statements = []
+
+    def _connect(self):
+        conn = super()._connect()
+        conn.set_trace_callback(lambda sql: self.statements.append((self.label, sql)))
+        return conn
+
+def seed(conn, campaigns):
+    """Fills the schema with `campaigns` campaigns' worth of gangs, assets, ledger rows, markets and offers."""
+    rng = random.Random(0)
+    now = datetime.utcnow()
+    asset_types = ("Territory", "Hanger-On", "Skill", "Equipment", "Captive", "Other")
+    catalog_ids = [row[0] for row in conn.execute("SELECT id FROM catalog_items")]
+
+    conn.executemany(
+        "INSERT INTO campaigns (id, name, created_by, server_id) VALUES (?, ?, ?, ?)",
+        [(c, f"Campaign {c}", f"user{c}", f"server{c % 50}") for c in range(1, campaigns + 1)]
+    )
+    gangs = [(g, f"user{g % 2000}", (g - 1) // GANGS_PER_CAMPAIGN + 1) for g in range(1, campaigns * GANGS_PER_CAMPAIGN + 1)]
+    conn.executemany(
+        "INSERT INTO gangs (id, user_id, campaign_id, yaktribe_url, gang_name, gang_type, credits, gangers) VALUES (?, ?, ?, ?, ?, 'Goliath', 0, '[]')",
+        [(g, user, c, f"https://yaktribe.games/underhive/gang/{g}", f"Gang {g}") for g, user, c in gangs]
+    )
+    conn.executemany(
+        "INSERT INTO gang_assets (gang_id, name, asset_type, static_value, roll_formula, should_sell) VALUES (?, ?, ?, ?, ?, ?)",
+        [
+            (g, f"Asset {g}-{a}", asset_types[a % len(asset_types)], rng.randint(0, 30), "d6*10" if a % 3 == 0 else None, a % 4 == 0)
+            for g, _, _ in gangs for a in range(ASSETS_PER_GANG)
+        ]
+    )
+    conn.executemany(
+        "INSERT INTO gang_transactions (gang_id, change, reason, user_id, timestamp) VALUES (?, ?, ?, 1, ?)",
+        [
+            (g, rng.randint(-50, 100), "Seed", (now - timedelta(hours=t)).strftime("%Y-%m-%d %H:%M:%S"))
+            for g, _, _ in gangs for t in range(TRANSACTIONS_PER_GANG)
+        ]
+    )
+    conn.executemany(
+        "INSERT INTO user_preferences (user_id, current_campaign_id, current_gang_id) VALUES (?, ?, ?)",
+        [(f"user{u}", u % campaigns + 1, u + 1) for u in range(2000)]
+    )
+    conn.executemany(
+        "INSERT INTO campaign_market (campaign_id, generated_at) VALUES (?, ?)",
+        [(c, (now - timedelta(hours=c % 200)).isoformat()) for c in range(1, campaigns + 1)]
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO campaign_market_items (campaign_id, section, catalog_item_id, quantity) VALUES (?, ?, ?, 1)",
+        [
+            (c, section, item_id)
+            for c in range(1, campaigns + 1)
+            for section, count in (("trading_post", 20), ("secret_stash", 5))
+            for item_id in rng.sample(catalog_ids, min(count, len(catalog_ids)))
+        ]
+    )
+    conn.executemany(
+        """INSERT INTO trade_offers (campaign_id, from_gang_id, to_gang_id, offered_assets, offered_credits,
+               requested_assets, requested_credits, status, created_at)
+           VALUES (?, ?, ?, '', 10, '', 0, ?, ?)""",
+        [
+            (c, (c - 1) * GANGS_PER_CAMPAIGN + 1, (c - 1) * GANGS_PER_CAMPAIGN + 2,
+             rng.choice(("pending", "accepted", "expired")), (now - timedelta(hours=o)).isoformat())
+            for c in range(1, campaigns + 1) for o in range(OFFERS_PER_CAMPAIGN)
+        ]
+    )
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.commit()
+
+def scenarios(campaigns):
+    """(name, call) for every db function, in an order where each call's rows exist."""
+    from db import banking, campaigns as campaign_db, gang_assets, gangs, marketplace, payday_jobs, user_preferences
+
+    campaign_id = campaigns // 2
+    gang_id = (campaign_id - 1) * GANGS_PER_CAMPAIGN + 1
+    other_gang_id = gang_id + 1
+    server_id = f"server{campaign_id % 50}"
+    user_id = f"user{gang_id % 2000}"
+    now = datetime.utcnow()
+    gang_data = {"name": "Traced Gang", "type": "Escher", "credits": 100, "meat": 2, "rating": 1000, "rep": 5, "wealth": 1100, "gangers": []}
+    state = {}
+
+    def history_second_page():
+        _, cursor, _, _ = banking.get_transaction_history(gang_id)
+        banking.get_transaction_history(gang_id, cursor=cursor)
+
+    def create_trade_offer():
+        state["asset_id"] = gang_assets.insert_gang_asset(gang_id, "Traded Asset", "Equipment")
+        state["offer_id"] = marketplace.create_trade_offer(campaign_id, gang_id, other_gang_id, str(state["asset_id"]), 10, "", 0)
+
+    def payday_job():
+        job, _ = payday_jobs.create_payday_job(campaign_id, "traced-cycle", 1)
+        pending = payday_jobs.get_pending_job_gangs(job.id)
+        payday_jobs.complete_job_gangs(job.id, [(g, 10, []) for g in pending[:5]], 1)
+        payday_jobs.skip_job_gangs(job.id, pending[5:])
+        payday_jobs.get_payday_job(job.id)
+        payday_jobs.get_unfinished_payday_jobs()
+        payday_jobs.finish_payday_job(job.id, "done")
+        payday_jobs.get_payday_job_results(job.id)
+
+    return [
+        ("add_campaign", lambda: campaign_db.add_campaign("Traced Campaign", user_id, server_id)),
+        ("get_all_campaigns", lambda: campaign_db.get_all_campaigns(server_id)),
+        ("get_campaign", lambda: campaign_db.get_campaign(campaign_id)),
+        ("search_campaigns", lambda: campaign_db.search_campaigns(server_id, "camp")),
+        ("add_gang", lambda: gangs.add_gang(user_id, campaign_id, "https://yaktribe.games/underhive/gang/0", gang_data)),
+        ("get_gang_by_id", lambda: gangs.get_gang_by_id(gang_id)),
+        ("get_gangs_by_campaign", lambda: gangs.get_gangs_by_campaign(campaign_id)),
+        ("get_gang_stats_by_campaign", lambda: gangs.get_gang_stats_by_campaign(campaign_id)),
+        ("update_gang_stats", lambda: gangs.update_gang_stats(campaign_id, [(gang_id, gang_data)])),
+        ("get_gangs_by_user", lambda: gangs.get_gangs_by_user(user_id)),
+        ("search_gangs", lambda: gangs.search_gangs(campaign_id, "gang")),
+        ("log_transaction", lambda: banking.log_transaction(gang_id, 25, "Traced", 1)),
+        ("get_current_credits", lambda: banking.get_current_credits(gang_id)),
+        ("get_transaction_history", history_second_page),
+        ("verify_balances", banking.verify_balances),
+        ("insert_gang_asset", lambda: state.update(new_asset=gang_assets.insert_gang_asset(gang_id, "Traced Asset", "Territory", 10))),
+        ("get_gang_assets", lambda: gang_assets.get_gang_assets(gang_id)),
+        ("update_gang_asset", lambda: gang_assets.update_gang_asset(state["new_asset"], name="Renamed Asset")),
+        ("search_gang_assets", lambda: gang_assets.search_gang_assets(gang_id, "asset")),
+        ("get_gang_assets_by_campaign", lambda: gang_assets.get_gang_assets_by_campaign(campaign_id)),
+        ("get_payday_assets_by_campaign", lambda: gang_assets.get_payday_assets_by_campaign(campaign_id)),
+        ("delete_gang_asset", lambda: gang_assets.delete_gang_asset(state["new_asset"])),
+        ("get_campaigns_due_for_rotation", lambda: marketplace.get_campaigns_due_for_rotation((now - timedelta(hours=100)).isoformat())),
+        ("get_market_generated_at", lambda: marketplace.get_market_generated_at(campaign_id)),
+        ("get_market_data", lambda: state.update(market=marketplace.get_market_data(campaign_id)[:2])),
+        ("save_market_data", lambda: marketplace.save_market_data(campaign_id, *state["market"])),
+        ("save_market_data_bulk", lambda: marketplace.save_market_data_bulk([(campaign_id, *state["market"])])),
+        ("find_campaigns_stocking", lambda: marketplace.find_campaigns_stocking(server_id, "las")),
+        ("create_trade_offer", create_trade_offer),
+        ("get_trade_offer", lambda: marketplace.get_trade_offer(state["offer_id"])),
+        ("get_trade_offers_by_campaign", lambda: marketplace.get_trade_offers_by_campaign(campaign_id, before_id=state["offer_id"])),
+        ("accept_trade_offer", lambda: marketplace.accept_trade_offer(state["offer_id"], other_gang_id, 1)),
+        ("expire_trade_offers", lambda: marketplace.expire_trade_offers((now - timedelta(hours=24)).isoformat())),
+        ("set_user_preferences", lambda: user_preferences.set_user_preferences(user_id, campaign_id, gang_id)),
+        ("get_user_preferences", lambda: user_preferences.get_user_preferences(user_id)),
+        ("payday_jobs", payday_job),
+        ("delete_gang", lambda: gangs.delete_gang(other_gang_id + 1, f"user{(other_gang_id + 1) % 2000}")),
+        ("delete_campaign", lambda: campaign_db.delete_campaign(campaigns, f"user{campaigns}", f"server{campaigns % 50}")),
+    ]
+
+def plan_problems(conn, sql, table_rows):
+    """
+    Returns the plan details of `sql` that are a full scan of a large table
+    or a temp B-tree sort, with table aliases replaced by the table name.
+    """
+    aliases = {}
+    for table, alias in TABLE_REFERENCE.findall(sql):
+        if table in table_rows:
+            aliases[table] = table
+            if alias and alias.lower() not in SQL_KEYWORDS:
+                aliases[alias] = table
+    problems = []
+    for _, _, _, detail in conn.execute(f"EXPLAIN QUERY PLAN {sql}"):
+        if "USE TEMP B-TREE" in detail:
+            problems.append(detail)
+            continue
+        match = re.match(r"SCAN (\w+)", detail)
+        table = aliases.get(match.group(1)) if match else None
+        if table_rows.get(table, 0) >= LARGE_TABLE_ROWS:
+            problems.append(f"SCAN {table}{detail[match.end():]}")
+    return problems
+
+def is_allowed(name, detail):
+    return any(name == allowed_name and detail.startswith(prefix) for allowed_name, prefix in ALLOWED)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--campaigns", type=int, default=300)
+    parser.add_argument("--verbose", action="store_true", help="print every statement's plan")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_FILE = os.path.join(tmp, "necromunda.db")
+        db.init_db()
+        conn = db.get_connection()
+        seed(conn, args.campaigns)
+        table_rows = {
+            name: conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+            for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'").fetchall()
+        }
+        conn.close()
+        db.close_pool()
+
+        pool = db._pool = TracingPool(db.DB_FILE, max_size=db.DB_POOL_SIZE)
+        for name, call in scenarios(args.campaigns):
+            pool.label = name
+            call()
+        pool.label = None
+
+        from db.writer import close_write_queue
+        close_write_queue()
+
+        conn = db.get_connection()
+        conn.set_trace_callback(None)
+        failures = []
+        checked = set()
+        for name, sql in pool.statements:
+            if name is None or IGNORED_STATEMENTS.match(sql) or (name, sql) in checked:
+                continue
+            checked.add((name, sql))
+            problems = [p for p in plan_problems(conn, sql, table_rows) if not is_allowed(name, p)]
+            if args.verbose or problems:
+                print(f"{name}: {' '.join(sql.split())[:160]}")
+                for _, _, _, detail in conn.execute(f"EXPLAIN QUERY PLAN {sql}"):
+                    print(f"       {detail}")
+                for problem in problems:
+                    print(f"    !! {problem}")
+            failures.extend((name, p) for p in problems)
+        conn.close()
+        db.close_pool()
+
+    print(f"Checked {len(checked)} statements from {len({name for name, _ in checked})} functions against {table_rows['gang_transactions']} ledger rows.")
+    if failures:
+        print(f"{len(failures)} plan problem(s):")
+        for name, detail in failures:
+            print(f"  {name}: {detail}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
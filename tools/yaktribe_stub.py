@@ -0,0 +1,81 @@
+"""
+Local stand-in for Yaktribe that serves saved gang print pages.
+
+Serves tools/fixtures/yaktribe/<gang id>.html at
+/underhive/print/gang/<gang id>, so /gang register and friends can be
+exercised without the real site:
+
+    python tools/yaktribe_stub.py --port 8765 --delay 2 --fail-rate 0.3
+    YAKTRIBE_BASE_URL=http://127.0.0.1:8765 python discord_bot.py
+
+Use --delay and --fail-rate to exercise the client's timeouts and retries.
+Responses carry an ETag and Last-Modified, and conditional requests get a
+304, like the real site.
+"""
+import argparse
+import hashlib
+import os
+import random
+import re
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "yaktribe")
+GANG_PATH = re.compile(r"^/underhive/print/gang/(\d+)")
+
+def make_handler(fixtures_dir, delay, fail_rate):
+    class YaktribeStubHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if delay:
+                time.sleep(delay)
+            if fail_rate and random.random() < fail_rate:
+                self.send_error(503, "Simulated outage")
+                return
+
+            match = GANG_PATH.match(self.path)
+            path = match and os.path.join(fixtures_dir, f"{match.group(1)}.html")
+            if not path or not os.path.exists(path):
+                self.send_error(404, "Gang not found")
+                return
+
+            with open(path, "rb") as f:
+                body = f.read()
+            etag = '"%s"' % hashlib.md5(body).hexdigest()
+            last_modified = formatdate(os.path.getmtime(path), usegmt=True)
+            if self.headers.get("If-None-Match") == etag or (
+                "If-None-Match" not in self.headers and self.headers.get("If-Modified-Since") == last_modified
+            ):
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", last_modified)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return YaktribeStubHandler
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="Directory of <gang id>.html pages")
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds to wait before every response")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 503")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args.fixtures, args.delay, args.fail_rate))
+    print(f"Serving Yaktribe fixtures from {args.fixtures} on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()